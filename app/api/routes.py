@@ -1,83 +1,121 @@
+import asyncio
+import json
 from datetime import date
-
-from fastapi import APIRouter, Request, Response
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-
-from app.config import CHILDREN, REWARD_PER_CORRECT, DAILY_LIMIT
-from app.services.session_service import SessionService
-from app.services.stats_service import StatsService
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
+
+from app.config import (
+    ANSWER_BATCH_MAX,
+    DAILY_LIMIT,
+    REWARD_PER_CORRECT,
+    STATS_STREAM_HEARTBEAT_S,
+)
+from app.db.executor import AsyncProxy, DbExecutor
+from app.services.profile_service import ProfileService
+from app.services.session_service import SessionContext, SessionService
+from app.services.stats_service import RANGES, StatsService
 from app.services.question_service import QuestionService
 from app.services.admin_service import AdminService
+from app.services.export_service import EXPORTS, FORMATS, ExportService
+from app.web.response_cache import ResponseCache
 from app.web.templates import templates
 
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
 def build_router(
     session_svc: SessionService,
     stats_svc: StatsService,
     q_svc: QuestionService,
     admin_svc: AdminService,
+    db: DbExecutor,
+    cache: ResponseCache,
+    profile_svc: ProfileService,
+    export_svc: ExportService,
 ):
     r = APIRouter()
 
+    # semua akses SQLite dari route lewat DbExecutor, event loop tidak pernah nunggu disk
+    sessions = AsyncProxy(session_svc, db)
+    stats = AsyncProxy(stats_svc, db)
+    questions = AsyncProxy(q_svc, db)
+    admin = AsyncProxy(admin_svc, db)
+    profiles = AsyncProxy(profile_svc, db)
+
+    async def session_ctx(request: Request) -> SessionContext:
+        # satu kali baca tabel sessions per request; cookie baru dipasang oleh middleware di main
+        ctx = getattr(request.state, "session", None)
+        if ctx is None:
+            ctx = await sessions.load(request)
+            request.state.session = ctx
+        return ctx
+
     @r.get("/favicon.ico")
-    def favicon():
+    async def favicon():
         return Response(status_code=204)
 
     @r.get("/.well-known/{path:path}")
-    def well_known(path: str):
+    async def well_known(path: str):
         return Response(status_code=204)
 
     @r.get("/")
-    def root(request: Request):
-        resp = RedirectResponse(url="/start")
-        session_svc.get_or_create(request, resp)
-        return resp
+    async def root(sess: SessionContext = Depends(session_ctx)):
+        return RedirectResponse(url="/start")
 
     @r.get("/start")
-    def start(request: Request):
-        resp = RedirectResponse(url="/home")
-        sess = session_svc.get_or_create(request, resp)
-        if session_svc.require_child(sess):
+    async def start(sess: SessionContext = Depends(session_ctx)):
+        if sess.child:
             return RedirectResponse(url="/quiz")
-        return resp
+        return RedirectResponse(url="/home")
 
     @r.get("/home", response_class=HTMLResponse)
-    def home_page(request: Request):
-        resp = templates.TemplateResponse(
-            "home.html",
-            {
-                "request": request,
-                "DAILY_LIMIT": DAILY_LIMIT,
-                "REWARD_PER_CORRECT": REWARD_PER_CORRECT,
-            }
-        )
-        session_svc.get_or_create(request, resp)  # set cookie / session ke response ini
-        return resp
+    async def home_page(request: Request, sess: SessionContext = Depends(session_ctx)):
+        # grup yang terikat ke sesi (lewat POST /api/group), bukan dari query:
+        # daftar profil grup lain tidak bisa dibuka cuma dengan ?group=
+        group, _ = await profiles.scope(sess.group, sess.child)
+
+        async def render():
+            return templates.TemplateResponse(
+                "home.html",
+                {
+                    "request": request,
+                    "profiles": await profiles.listing(group),
+                    "group": group,
+                    "DAILY_LIMIT": DAILY_LIMIT,
+                    "REWARD_PER_CORRECT": REWARD_PER_CORRECT,
+                }
+            )
+
+        key = ("home", group, await profiles.data_version())
+        return await cache.respond(request, key, render)
 
     @r.get("/home/{child}")
-    def select_child(request: Request, child: str):
-        resp = RedirectResponse(url="/quiz", status_code=303)
-        sess = session_svc.get_or_create(request, resp)
+    async def select_child(child: str, sess: SessionContext = Depends(session_ctx)):
         child = (child or "").strip().lower()
-        if child not in CHILDREN:
+        group, members = await profiles.scope(sess.group, sess.child)
+        if child not in members:
+            # cuma anak di grup sesi; grup lain dipilih dulu lewat POST /api/group
             return RedirectResponse(url="/home", status_code=303)
-        session_svc.set_child(sess, child)
-        return resp
+        await sessions.set_child(sess, child, group)
+        return RedirectResponse(url="/quiz", status_code=303)
 
     @r.get("/quiz", response_class=HTMLResponse)
-    def quiz_page(request: Request):
-        placeholder = HTMLResponse(content="")
-        sess = session_svc.get_or_create(request, placeholder)
-        child = session_svc.require_child(sess)
-        stat = session_svc.get_stats(sess) or {}
+    async def quiz_page(request: Request, sess: SessionContext = Depends(session_ctx)):
+        child = sess.child
 
         if not child:
             return RedirectResponse(url="/home")
 
-        today = date.today().isoformat()
-        recap = stats_svc.get_daily_recap(child, [today])
-
         days = stats_svc.last_n_days(7)
-        week_recap = {c: stats_svc.get_daily_recap(c, days) for c in CHILDREN}
+        key = ("quiz", child, days[-1], await stats.data_version([child]))
+        return await cache.respond(request, key, lambda: render_quiz(request, child, days))
+
+    async def render_quiz(request: Request, child: str, days):
+        week_recap = await stats.get_recaps([child], days)
+        today_row = week_recap[child]["days"][-1]
         week_accuracy = week_recap[child]["totals"]["accuracy_pct"]
         week_answered = week_recap[child]["totals"]["answered_count"]
 
@@ -88,48 +126,69 @@ def build_router(
             else "Pemula"
         )
 
-        resp = templates.TemplateResponse(
+        return templates.TemplateResponse(
             "quiz.html",
             {
                 "request": request,
                 "child": child,
-                "answered_today": int(recap["days"][0].get("answered_count", 0) or 0),
-                "correct_count": int(recap["days"][0].get("correct_count", 0) or 0),
-                "earned": int(recap["days"][0].get("earned", 0) or 0),
+                "answered_today": int(today_row.get("answered_count", 0) or 0),
+                "correct_count": int(today_row.get("correct_count", 0) or 0),
+                "earned": int(today_row.get("earned", 0) or 0),
                 "level": level,
                 "DAILY_LIMIT": DAILY_LIMIT,
                 "REWARD_PER_CORRECT": REWARD_PER_CORRECT,
             }
         )
-        session_svc.get_or_create(request, resp)
-        return resp
 
     @r.get("/stats", response_class=HTMLResponse)
-    def stats_page(request: Request):
-        resp = templates.TemplateResponse(
-            "stats.html",
-            {"request": request, "title": "Quiz Statistics"}
-        )
-        session_svc.get_or_create(request, resp)
-        return resp
+    async def stats_page(request: Request, sess: SessionContext = Depends(session_ctx)):
+        group, _ = await profiles.scope(sess.group, sess.child)
 
-    @r.get("/api/stats")
-    def api_stats(request: Request):
-        resp = JSONResponse({})
-        sess = session_svc.get_or_create(request, resp)
-        s = session_svc.get_stats(sess) or {}
-        child = session_svc.require_child(sess)
+        async def render():
+            return templates.TemplateResponse(
+                "stats.html",
+                {"request": request, "title": "Quiz Statistics", "profiles": await profiles.listing(group)}
+            )
 
-        days = stats_svc.last_n_days(7)
-        recap = {c: stats_svc.get_daily_recap(c, days) for c in CHILDREN}
+        key = ("stats", group, await profiles.data_version())
+        return await cache.respond(request, key, render)
 
-        today = date.today().isoformat()
-        today_recap = stats_svc.get_daily_recap(child, [today])
+    @r.get("/api/stats")
+    async def api_stats(request: Request, range: Optional[str] = None, sess: SessionContext = Depends(session_ctx)):
+        # dashboard polling: versi data dibaca sebelum render, jadi tulisan baru selalu ganti ETag
+        # cuma anak di grup/keluarga pemanggil yang dihitung, bukan semua profil
+        range = range or "7d"
+        group, members = await profiles.scope(sess.group, sess.child)
+        key = ("api_stats", range, sess.child, sess.day, date.today().isoformat(), group, await stats.data_version(members))
+        return await cache.respond(request, key, lambda: render_stats(sess, range, members))
+
+    async def render_stats(sess: SessionContext, range: str, members):
+        child = sess.child
+
+        if range != "7d":
+            # rentang panjang: total dari rollup minggu/bulan/all-time
+            if range not in RANGES:
+                return JSONResponse(
+                    {"ok": False, "message": f"range harus salah satu dari {', '.join(RANGES)}"}, status_code=400
+                )
+            recap = await stats.get_range_recaps(members, range)
+            return JSONResponse({"ok": True, "child": child, "generated_at": session_svc.now_str(), **recap})
+
+        return JSONResponse(await recap7_payload(sess, members))
+
+    async def recap7_payload(sess: SessionContext, members, stream: bool = False) -> dict:
+        days = stats_svc.last_n_days(7)
+        version = None
+        if stream:
+            # snapshot SSE: versi delta terakhir yang sudah termasuk di recap
+            (recap, today_recap), version = await stats.snapshot(stats_svc.get_recap7, sess.child, members, days)
+        else:
+            recap, today_recap = await stats.get_recap7(sess.child, members, days)
 
         payload = {
             "ok": True,
-            "child": s.get("child"),
-            "day": s.get("day"),
+            "child": sess.child,
+            "day": sess.day,
             "served_count": int(today_recap["days"][0].get("served_count", 0) or 0),
             "answered_count": int(today_recap["days"][0].get("answered_count", 0) or 0),
             "correct_count": int(today_recap["days"][0].get("correct_count", 0) or 0),
@@ -140,47 +199,159 @@ def build_router(
                 "children": recap,
             },
         }
-        return JSONResponse(payload)
+        if version is not None:
+            payload["version"] = version
+        return payload
+
+    @r.get("/api/stats/stream")
+    async def api_stats_stream(sess: SessionContext = Depends(session_ctx)):
+        # SSE: satu event "snapshot" (isi sama dengan /api/stats), lalu "delta" per tulisan counter.
+        # Subscribe sebelum snapshot dibaca supaya tidak ada delta yang terlewat di antaranya; delta
+        # dengan version <= versi snapshot sudah termasuk di snapshot, jadi tidak dikirim lagi.
+        bus = stats_svc.bus
+        if bus is None:
+            return JSONResponse({"ok": False, "message": "Stream tidak aktif."}, status_code=404)
+
+        _, members = await profiles.scope(sess.group, sess.child)
+        wanted = set(members)
+        sub = bus.subscribe()
+
+        async def events():
+            try:
+                snapshot = await recap7_payload(sess, members, stream=True)
+                yield sse("snapshot", snapshot)
+                while not sub.overflow:
+                    try:
+                        event = await asyncio.wait_for(sub.queue.get(), STATS_STREAM_HEARTBEAT_S or None)
+                    except asyncio.TimeoutError:
+                        yield ": ping\n\n"
+                        continue
+                    if event.get("child") is not None and event["child"] not in wanted:
+                        continue
+                    if event["type"] == "delta" and event["version"] <= snapshot["version"]:
+                        continue
+                    yield sse(event["type"], event)
+            finally:
+                bus.unsubscribe(sub)
+
+        return StreamingResponse(
+            events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
 
-    @r.get("/api/question")
-    def api_question(request: Request):
-        resp = JSONResponse({})
-        sess = session_svc.get_or_create(request, resp)
-        stats = session_svc.get_stats(sess)
+    @r.get("/api/export/{kind}")
+    async def api_export(
+        kind: str,
+        format: str = "csv",
+        child: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        sess: SessionContext = Depends(session_ctx),
+    ):
+        # kind: daily (child_daily) atau events (answer_events); cuma anak di grup pemanggil
+        if kind not in EXPORTS:
+            return JSONResponse({"ok": False, "message": f"Export harus salah satu dari {', '.join(EXPORTS)}"}, status_code=404)
+        if format not in FORMATS:
+            return JSONResponse({"ok": False, "message": f"format harus salah satu dari {', '.join(FORMATS)}"}, status_code=400)
+        try:
+            start_day, end_day = export_svc.parse_day(start), export_svc.parse_day(end)
+        except ValueError:
+            return JSONResponse({"ok": False, "message": "start / end harus YYYY-MM-DD"}, status_code=400)
+
+        group, members = await profiles.scope(sess.group, sess.child)
+        if child is not None:
+            if child not in members:
+                return JSONResponse({"ok": False, "message": "Anak tidak ditemukan."}, status_code=404)
+            members = [child]
+
+        chunks = export_svc.open(kind, format, members, start_day, end_day)
+
+        async def body():
+            # satu batch per hop ke DbExecutor: request lain tetap dapat giliran di antaranya
+            try:
+                while True:
+                    chunk = await db.run(next, chunks, None)
+                    if chunk is None:
+                        break
+                    yield chunk
+            finally:
+                try:
+                    await db.run(chunks.close)
+                except ValueError:
+                    # klien putus saat next() masih jalan di thread lain; generator ditutup GC
+                    pass
+
+        filename = f"{kind}-{child or group}.{format}"
+        return StreamingResponse(
+            body(),
+            media_type=FORMATS[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+        )
 
-        if not stats or not stats.get("child"):
+    @r.get("/api/question")
+    async def api_question(sess: SessionContext = Depends(session_ctx)):
+        if not sess.child:
             return JSONResponse({"ok": False, "message": "Pilih akun dulu."}, status_code=400)
 
-        child = stats["child"]
+        child = sess.child
 
-        payload, code = q_svc.get_question_payload(sess, child)
+        payload, code = await questions.get_question_payload(sess.session_id, child)
 
         if not payload.get("ok"):
             return JSONResponse(payload, status_code=code)
 
         qid = payload["qid"]
-        session_svc.set_current_qid(sess, qid)
-
         today = session_svc.today_str()
-        stats_svc.inc_served(sess, child, today)
+        await stats.record_served(sess.counter_session_id, child, today, qid)
+        sess.stage_current_qid(qid)
 
         return JSONResponse(payload)
 
-    @r.post("/api/answer")
-    async def api_answer(request: Request):
-        resp = JSONResponse({})
-        sess = session_svc.get_or_create(request, resp)
-        stats = session_svc.get_stats(sess)
-
-        if not stats or not stats.get("child"):
+    @r.get("/api/questions")
+    async def api_questions(n: int = 10, held: int = 0, sess: SessionContext = Depends(session_ctx)):
+        # prefetch beberapa soal sekaligus; jawaban dikirim dengan token masing-masing.
+        # served_count dihitung saat token dijawab, jadi reload / prefetch ulang tidak menggelembungkan counter
+        if not sess.child:
             return JSONResponse({"ok": False, "message": "Pilih akun dulu."}, status_code=400)
 
-        child = stats["child"]
+        payload, code = await questions.get_question_batch(sess.child, n, held)
+        return JSONResponse(payload, status_code=code)
+
+    async def record_token_answers(sess: SessionContext, results, answers, index):
+        # hasil grade_token_answers -> answered_tokens + counter; results ditandai duplicate per item
+        if not answers:
+            return
+        applied = await stats.record_token_answers(sess.counter_session_id, sess.child, answers, REWARD_PER_CORRECT)
+        per_child = {}
+        for i, ok, a in zip(index, applied, answers):
+            results[i]["duplicate"] = not ok
+            if ok:
+                per_child.setdefault(a[1], []).append((a[3], a[5]))
+        for child, done in per_child.items():
+            await questions.record_results(child, done)
+
+    @r.post("/api/answer")
+    async def api_answer(request: Request, sess: SessionContext = Depends(session_ctx)):
         body = await request.json()
         qid = (body.get("qid") or "").strip()
         ans = (body.get("answer") or "").strip()
 
-        if not stats.get("current_qid") or qid != stats["current_qid"]:
+        token = body.get("token")
+        if token:
+            # penilaian sama dengan /api/answers (termasuk DAILY_LIMIT), satu item
+            record = {"token": token, "answer": ans, "ts": body.get("ts"), "latency_ms": body.get("latency_ms")}
+            results, answers, index = await questions.grade_token_answers([record])
+            result = results[0]
+            if not result["ok"]:
+                return JSONResponse(result, status_code=200 if result.get("limit") else 400)
+
+            await record_token_answers(sess, results, answers, index)
+            return JSONResponse(result)
+
+        if not sess.child:
+            return JSONResponse({"ok": False, "message": "Pilih akun dulu."}, status_code=400)
+
+        child = sess.child
+        if not sess.current_qid or qid != sess.current_qid:
             return JSONResponse({"ok": False, "message": "Soal tidak sinkron. Klik Next lagi."}, status_code=400)
 
         q, correct_val, correct = q_svc.evaluate_answer(qid, ans)
@@ -188,33 +359,140 @@ def build_router(
             return JSONResponse({"ok": False, "message": "Soal tidak ditemukan."}, status_code=400)
 
         today = session_svc.today_str()
-        stats_svc.inc_answered(sess, child, today)
-
-        if correct:
-            stats_svc.mark_correct(sess, child, today, REWARD_PER_CORRECT)
-
-        session_svc.set_current_qid(sess, None)
-        return JSONResponse({"ok": True, "correct": correct, "correct_answer": correct_val})
+        event = (qid, ans, q_svc.latency_ms(body.get("latency_ms")), session_svc.now_str())
+        applied = await stats.record_answer(
+            sess.counter_session_id, child, today, correct, REWARD_PER_CORRECT, event, sess.question_nonce
+        )
+        if applied:
+            await questions.record_results(child, [(qid, correct)])
+        sess.stage_current_qid(None)
+        return JSONResponse({"ok": True, "correct": correct, "correct_answer": correct_val, "duplicate": not applied})
+
+    @r.post("/api/answers")
+    async def api_answers(request: Request, sess: SessionContext = Depends(session_ctx)):
+        # antrian jawaban offline dari service worker: {"answers": [{"token", "answer", "ts"}, ...]}.
+        # Satu transaksi untuk seluruh batch; token yang sudah tercatat dilaporkan duplicate.
+        # Tidak butuh anak di sesi: tiap token sudah membawa anaknya sendiri.
+        try:
+            body = await request.json()
+        except Exception:
+            body = {}
+        records = body.get("answers") if isinstance(body, dict) else None
+        if not isinstance(records, list) or len(records) > ANSWER_BATCH_MAX:
+            return JSONResponse(
+                {"ok": False, "message": f"Kirim daftar answers (maksimal {ANSWER_BATCH_MAX})."}, status_code=400
+            )
+
+        results, answers, index = await questions.grade_token_answers(records)
+        await record_token_answers(sess, results, answers, index)
+        return JSONResponse({"ok": True, "results": results})
+
+    @r.post("/api/group")
+    async def api_group(request: Request, sess: SessionContext = Depends(session_ctx)):
+        # {"group"}: ikat sesi ke grup/keluarga lain; anak yang sedang dipilih dilepas
+        try:
+            body = await request.json()
+        except Exception:
+            body = {}
+        group = str(body.get("group") or "").strip() if isinstance(body, dict) else ""
+        if not group or not await profiles.members(group):
+            return JSONResponse({"ok": False, "message": "Grup tidak ditemukan."}, status_code=404)
+        await sessions.set_group(sess, group)
+        return JSONResponse({"ok": True, "group": group})
 
     @r.post("/api/logout")
-    def api_logout(request: Request):
-        sess = request.cookies.get("math_sess")
-        if sess:
-            session_svc.logout(sess)
+    async def api_logout(sess: SessionContext = Depends(session_ctx)):
+        await sessions.logout(sess)
         return JSONResponse({"ok": True})
 
-    @r.post("/api/admin/clear")
-    async def api_admin_clear(request: Request):
+    async def admin_body(request: Request) -> dict:
         try:
             body = await request.json()
         except Exception:
             body = {}
-        ok, msg = admin_svc.clear_db(body.get("password") or "")
-        return JSONResponse({"ok": ok, "message": msg}, status_code=200 if ok else 401)
+        return body if isinstance(body, dict) else {}
+
+    def denied():
+        return JSONResponse({"ok": False, "message": "Password salah."}, status_code=401)
+
+    def job_response(job):
+        # 202 + id job untuk di-poll; 409 kalau job lain masih jalan
+        if job is None:
+            return JSONResponse(
+                {"ok": False, "message": "Masih ada proses admin lain yang berjalan.", "job": admin_svc.jobs.current()},
+                status_code=409,
+            )
+        return JSONResponse({"ok": True, "job": job}, status_code=202)
+
+    @r.post("/api/admin/clear")
+    async def api_admin_clear(request: Request):
+        body = await admin_body(request)
+        if not admin_svc.check_password(body.get("password") or ""):
+            return denied()
+        return job_response(admin_svc.start_clear())
+
+    @r.post("/api/admin/backup")
+    async def api_admin_backup(request: Request):
+        body = await admin_body(request)
+        if not admin_svc.check_password(body.get("password") or ""):
+            return denied()
+        return job_response(admin_svc.start_backup())
+
+    @r.post("/api/admin/vacuum")
+    async def api_admin_vacuum(request: Request):
+        # konversi sekali database lama ke auto_vacuum INCREMENTAL (VACUUM penuh, tulisan lain menunggu)
+        body = await admin_body(request)
+        if not admin_svc.check_password(body.get("password") or ""):
+            return denied()
+        return job_response(admin_svc.start_vacuum())
+
+    @r.post("/api/admin/restore")
+    async def api_admin_restore(request: Request):
+        # {"password", "name"}: name dari GET /api/admin/backups
+        body = await admin_body(request)
+        if not admin_svc.check_password(body.get("password") or ""):
+            return denied()
+        try:
+            job = admin_svc.start_restore(str(body.get("name") or ""))
+        except ValueError as e:
+            return JSONResponse({"ok": False, "message": str(e)}, status_code=404)
+        return job_response(job)
+
+    @r.get("/api/admin/jobs/{job_id}")
+    async def api_admin_job(job_id: str):
+        # id job acak (tidak bisa ditebak), jadi polling tanpa password
+        job = admin_svc.job(job_id)
+        if job is None:
+            return JSONResponse({"ok": False, "message": "Job tidak ditemukan."}, status_code=404)
+        return {"ok": True, "job": job}
+
+    @r.get("/api/admin/backups")
+    async def api_admin_backups(request: Request):
+        if not admin_svc.check_password(request.headers.get("x-admin-password") or ""):
+            return denied()
+        return {"ok": True, "backups": await admin.list_backups()}
+
+    @r.get("/api/admin/backups/{name}")
+    async def api_admin_backup_download(name: str, request: Request):
+        if not admin_svc.check_password(request.headers.get("x-admin-password") or ""):
+            return denied()
+        path = admin_svc.backup_path(name)
+        if path is None:
+            return JSONResponse({"ok": False, "message": "Backup tidak ditemukan."}, status_code=404)
+        return FileResponse(path, media_type="application/vnd.sqlite3", filename=name)
+
+    @r.post("/api/admin/profiles")
+    async def api_admin_profiles(request: Request):
+        # buat / ubah profil: {"password", "name", "display_name", "group", "bank_version"}
+        body = await admin_body(request)
+        if not admin_svc.check_password(body.get("password") or ""):
+            return denied()
+        ok, msg, profile = await admin.upsert_profile(body)
+        return JSONResponse({"ok": ok, "message": msg, "profile": profile}, status_code=200 if ok else 400)
 
     @r.get("/manifest.json")
     @r.get("/manifest.webmanifest")
-    def manifest():
+    async def manifest():
         return {
             "name": "Altha dan Leia Quiz",
             "short_name": "Altha dan Leia Quiz",
@@ -225,8 +503,13 @@ def build_router(
             "icons": [{"src": "/static/icon-512.png", "sizes": "512x512", "type": "image/png"}],
         }
 
+    @r.get("/sw.js")
+    async def service_worker():
+        # dilayani dari root supaya scope service worker mencakup /quiz dan /api
+        return FileResponse("static/sw.js", media_type="application/javascript", headers={"Cache-Control": "no-cache"})
+
     @r.get("/health")
-    def health():
+    async def health():
         return {"ok": True}
 
     return r
\ No newline at end of file
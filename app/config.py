@@ -1,11 +1,115 @@
 import os
+import secrets
+import time
 
 APP_TITLE = "Kids Math Quiz"
 DAILY_LIMIT = 400
 REWARD_PER_CORRECT = 50
 COOKIE_NAME = "math_sess"
 
+# sqlite (default) atau memory: semua data di RAM, snapshot opsional ke file SQLite
+STORAGE = os.getenv("STORAGE", "sqlite")
+MEMORY_SNAPSHOT_PATH = os.getenv("MEMORY_SNAPSHOT_PATH", "")
+MEMORY_SNAPSHOT_INTERVAL_S = float(os.getenv("MEMORY_SNAPSHOT_INTERVAL_S", "60"))
 DB_PATH = os.getenv("DB_PATH", "math_app.sqlite3")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+# ukuran thread pool khusus SQLite yang dipakai route async
+DB_THREADS = int(os.getenv("DB_THREADS", "4"))
+# Semua mutasi lewat satu thread writer per proses (group commit), bacaan tetap paralel
+DB_WRITER = os.getenv("DB_WRITER", "0") == "1"
+DB_WRITER_MAX_BATCH = int(os.getenv("DB_WRITER_MAX_BATCH", "256"))
+DB_WRITER_MAX_WAIT_MS = float(os.getenv("DB_WRITER_MAX_WAIT_MS", "2"))
+# Write-behind counter (served/answered/correct). Nonaktif secara default.
+COUNTER_BUFFER = os.getenv("COUNTER_BUFFER", "0") == "1"
+COUNTER_FLUSH_INTERVAL_S = float(os.getenv("COUNTER_FLUSH_INTERVAL_S", "2"))
+COUNTER_FLUSH_MAX_OPS = int(os.getenv("COUNTER_FLUSH_MAX_OPS", "500"))
+# Log per jawaban (answer_events), di-insert batch oleh thread appender
+EVENT_LOG = os.getenv("EVENT_LOG", "1") == "1"
+EVENT_FLUSH_INTERVAL_S = float(os.getenv("EVENT_FLUSH_INTERVAL_S", "1"))
+EVENT_FLUSH_MAX_ROWS = int(os.getenv("EVENT_FLUSH_MAX_ROWS", "500"))
+# Spaced repetition per soal (item_mastery); 0 = pilih acak per tier seperti dulu
+MASTERY_SCHEDULER = os.getenv("MASTERY_SCHEDULER", "1") == "1"
+MASTERY_FLUSH_INTERVAL_S = float(os.getenv("MASTERY_FLUSH_INTERVAL_S", "5"))
+# LRU hasil render /api/stats dan halaman (per ETag); 0 = cuma ETag/304 tanpa simpan body
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+# /api/stats/stream (SSE): pub/sub in-process, heartbeat untuk koneksi idle
+STATS_STREAM = os.getenv("STATS_STREAM", "1") == "1"
+STATS_STREAM_HEARTBEAT_S = float(os.getenv("STATS_STREAM_HEARTBEAT_S", "25"))
+# Tier hasil kalibrasi (python -m app.jobs.calibrate) cuma dipakai untuk soal dengan jawaban sebanyak ini
+CALIBRATION_MIN_RESPONSES = int(os.getenv("CALIBRATION_MIN_RESPONSES", "20"))
+# Janitor background: hapus sesi lama & token kedaluwarsa per batch, lalu incremental_vacuum
+JANITOR = os.getenv("JANITOR", "1") == "1"
+JANITOR_INTERVAL_S = float(os.getenv("JANITOR_INTERVAL_S", "3600"))
+SESSION_TTL_DAYS = int(os.getenv("SESSION_TTL_DAYS", "30"))
+JANITOR_BATCH = int(os.getenv("JANITOR_BATCH", "1000"))
+JANITOR_VACUUM_PAGES = int(os.getenv("JANITOR_VACUUM_PAGES", "256"))
+
+# Cache recap harian di memori (per proses). Default mati: dengan >1 worker counter di cache
+# worker lain basi (DAILY_LIMIT, tier adaptif). Nyalakan cuma untuk satu worker.
+RECAP_CACHE = os.getenv("RECAP_CACHE", "0") == "1"
+RECAP_CACHE_DAYS = int(os.getenv("RECAP_CACHE_DAYS", "7"))
+
+def _load_secret_key(path: str) -> str:
+    # Dibuat sekali lalu disimpan di file, supaya token soal / antrean offline / cookie stateless
+    # tetap valid setelah restart dan sama di semua worker. O_EXCL: worker yang kalah balapan membaca file.
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        for _ in range(50):
+            with open(path) as f:
+                key = f.read().strip()
+            if key:
+                return key
+            time.sleep(0.02)
+        raise RuntimeError(f"{path} kosong; hapus file itu atau set SECRET_KEY")
+    key = secrets.token_urlsafe(32)
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    return key
+
+
+# Kunci HMAC untuk qid / token / cookie bertanda tangan. Set SECRET_KEY di production;
+# kalau kosong dipakai (atau dibuat) SECRET_KEY_FILE yang dibaca semua worker.
+SECRET_KEY_FILE = os.getenv("SECRET_KEY_FILE", ".secret_key")
+SECRET_KEY = os.getenv("SECRET_KEY") or _load_secret_key(SECRET_KEY_FILE)
+
+# "db" = sesi di tabel sessions, "cookie" = sesi stateless di cookie bertanda tangan
+SESSION_MODE = os.getenv("SESSION_MODE", "db")
+SESSION_COOKIE_TTL_S = int(os.getenv("SESSION_COOKIE_TTL_S", str(30 * 24 * 3600)))
+
+# "bank" = bank soal statis, "procedural" = soal dibuat on the fly, qid berisi operand
+QUESTION_MODE = os.getenv("QUESTION_MODE", "bank")
+QID_SIGNED = os.getenv("QID_SIGNED", "1") == "1"
+# Bank besar hasil generator NumPy (v3: +, -, ×, :, dan soal dua langkah). 0 = tidak dibuat.
+BULK_BANK_SIZE = int(os.getenv("BULK_BANK_SIZE", "0"))
+BULK_BANK_SEED = int(os.getenv("BULK_BANK_SEED", "303"))
+# /api/questions: maksimum soal per batch dan umur token soal
+QUESTION_BATCH_MAX = int(os.getenv("QUESTION_BATCH_MAX", "50"))
+QUESTION_TOKEN_TTL_S = int(os.getenv("QUESTION_TOKEN_TTL_S", str(24 * 3600)))
+# /api/export: baris per fetchmany / potongan response
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "1000"))
+# /api/answers: maksimum jawaban offline per request
+ANSWER_BATCH_MAX = int(os.getenv("ANSWER_BATCH_MAX", "200"))
+# Snapshot biner bank soal; kosongkan untuk selalu generate ulang saat start
+BANK_CACHE_DIR = os.getenv("BANK_CACHE_DIR", ".bank_cache")
+
 ADMIN_CLEAR_PASSWORD = os.getenv("ADMIN_CLEAR_PASSWORD", "masukaja")
+# Job admin: clear per batch, backup online lewat sqlite3 backup API
+ADMIN_CLEAR_BATCH = int(os.getenv("ADMIN_CLEAR_BATCH", "2000"))
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", "1024"))
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "3"))
+
+# CHILDREN / CHILD_BANKS mengisi tabel profiles saat start (profil yang belum ada saja)
+CHILDREN = ["althafandra", "alleia"]
+PROFILE_DEFAULT_GROUP = os.getenv("PROFILE_DEFAULT_GROUP", "default")
+# cache profil per proses dicek ulang ke versi profil di database paling lama setiap sekian detik
+PROFILE_CACHE_TTL_S = float(os.getenv("PROFILE_CACHE_TTL_S", "2"))
 
-CHILDREN = ["althafandra", "alleia"]
\ No newline at end of file
+# versi bank per anak, bisa di-override: CHILD_BANKS="alleia:1,althafandra:3"
+CHILD_BANKS = {"alleia": 1, "althafandra": 2}
+for _pair in filter(None, os.getenv("CHILD_BANKS", "").split(",")):
+    _child, _, _ver = _pair.partition(":")
+    CHILD_BANKS[_child.strip().lower()] = int(_ver)
@@ -0,0 +1,39 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DbExecutor:
+    # Thread pool khusus kerja SQLite, terpisah dari threadpool Starlette.
+    # Tiap thread pakai koneksi per-thread dari app.db.sqlite, jadi jumlah koneksi = max_workers.
+    def __init__(self, max_workers: int):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+
+    def start(self):
+        pass
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+class AsyncProxy:
+    # Varian async dari Repo / service: tiap method dijalankan di DbExecutor dan di-await.
+    # Satu panggilan method = satu hop ke thread DB, jadi kelompokkan kerja di level service.
+    def __init__(self, target, executor: DbExecutor):
+        self._target = target
+        self._executor = executor
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self._executor.run(attr, *args, **kwargs)
+
+        call.__name__ = name
+        return call
@@ -0,0 +1,613 @@
+import heapq
+import itertools
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+from app.db.repo import EPOCH_SCOPE, PROFILES_SCOPE, Repo
+
+log = logging.getLogger(__name__)
+
+COUNTERS = ("served_count", "answered_count", "correct_count", "earned")
+
+
+def _week_key(day: str) -> str:
+    # sama dengan trigger rollup: tanggal Senin minggu itu
+    d = date.fromisoformat(day)
+    return (d - timedelta(days=d.weekday())).isoformat()
+
+
+class MemoryRepo:
+    # Engine in-memory (STORAGE=memory): semua tabel di dict, satu RLock untuk semua operasi.
+    # Untuk event kelas yang datanya boleh hilang, dan sebagai baseline biaya storage.
+    # Snapshot opsional ke file SQLite dengan skema yang sama (bisa dibuka Repo / dipakai restore),
+    # ditulis berkala oleh start() dan sekali lagi saat close(); dimuat ulang saat start proses.
+    # Snapshot berkala cuma menulis baris yang berubah sejak snapshot sebelumnya (plus answer_events
+    # baru); file ditulis ulang penuh setelah clear / restore.
+    CLEAR_TABLES = Repo.CLEAR_TABLES
+    EPOCH_TABLES = Repo.EPOCH_TABLES
+    check_backup = staticmethod(Repo.check_backup)
+
+    def __init__(self, snapshot_path: str = "", snapshot_interval: float = 0):
+        self.writer = None
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # pengganti tabel data_versions: satu proses, jadi cukup dict di memori
+        self._versions = {EPOCH_SCOPE: secrets.randbits(62)}
+        self._reset_tables()
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load(snapshot_path)
+
+    def _reset_tables(self):
+        self._sessions = {}
+        self._daily = {}  # child -> day -> row
+        self._rollup = {}  # (child, period, key) -> [served, answered, correct, earned]
+        self._tokens = {}
+        self._profiles = {}
+        self._events = []
+        self._event_ids = itertools.count(1)
+        self._mastery = {}  # child -> qid -> row
+        self._calibration = {}
+        # indeks kedaluwarsa untuk janitor: heap (day, session_id) / (answered_at, nonce); entry basi
+        # (sesi yang day-nya sudah berubah, baris yang sudah dihapus) dilewati saat pop
+        self._session_expiry = []
+        self._token_expiry = []
+        self._changes = 0
+        self._saved = 0
+        # snapshot inkremental: key yang berubah per tabel, jumlah answer_events yang sudah ada di file
+        self._dirty = {}
+        self._events_saved = 0
+        self._full = True
+
+    def _tables(self) -> dict:
+        # nama tabel SQLite -> baris, untuk snapshot / clear / count
+        return {
+            "sessions": list(self._sessions.values()),
+            "child_daily": [r for days in self._daily.values() for r in days.values()],
+            "answered_tokens": list(self._tokens.values()),
+            "profiles": list(self._profiles.values()),
+            "answer_events": self._events,
+            "item_mastery": [r for items in self._mastery.values() for r in items.values()],
+            "item_calibration": list(self._calibration.values()),
+        }
+
+    def transaction(self):
+        return self._lock
+
+    def atomic(self, fn, *args, **kwargs):
+        with self._lock:
+            return fn(*args, **kwargs)
+
+    def migrate(self):
+        # skema ada di kode; snapshot lama dimuat apa adanya di load()
+        pass
+
+    def _touch(self, table: str = None, *keys):
+        self._changes += 1
+        if table:
+            self._dirty.setdefault(table, set()).update(keys)
+
+    def _lookup(self, table: str, key):
+        # baris untuk key di _dirty; None = sudah dihapus
+        if table == "sessions":
+            return self._sessions.get(key)
+        if table == "child_daily":
+            return self._daily.get(key[0], {}).get(key[1])
+        if table == "answered_tokens":
+            return self._tokens.get(key)
+        if table == "profiles":
+            return self._profiles.get(key)
+        if table == "item_mastery":
+            return self._mastery.get(key[0], {}).get(key[1])
+        return self._calibration.get(key)
+
+    # Profiles
+    def get_profile(self, name: str):
+        with self._lock:
+            row = self._profiles.get(name)
+            return dict(row) if row else None
+
+    def select_profiles_by_group(self, group: str):
+        with self._lock:
+            return [dict(r) for _, r in sorted(self._profiles.items()) if r["group_name"] == group]
+
+    def insert_profiles(self, rows):
+        with self._lock:
+            added = []
+            for name, display_name, group, bank_version, created_at in rows:
+                if name not in self._profiles:
+                    self._profiles[name] = {
+                        "name": name,
+                        "display_name": display_name,
+                        "group_name": group,
+                        "bank_version": bank_version,
+                        "created_at": created_at,
+                    }
+                    self._bump_versions([PROFILES_SCOPE])
+                    added.append(name)
+            self._touch("profiles", *added)
+
+    def upsert_profile(self, name: str, display_name: str, group: str, bank_version: int, created_at: str):
+        with self._lock:
+            old = self._profiles.get(name)
+            self._profiles[name] = {
+                "name": name,
+                "display_name": display_name,
+                "group_name": group,
+                "bank_version": bank_version,
+                "created_at": old["created_at"] if old else created_at,
+            }
+            self._bump_versions([PROFILES_SCOPE])
+            self._touch("profiles", name)
+
+    # Sessions
+    def get_session(self, session_id: str):
+        with self._lock:
+            row = self._sessions.get(session_id)
+            return dict(row) if row else None
+
+    def insert_session(self, session_id: str, day: str, created_at: str):
+        with self._lock:
+            if session_id in self._sessions:
+                return
+            self._sessions[session_id] = {
+                "session_id": session_id,
+                "child": None,
+                "group_name": None,
+                "day": day,
+                "served_count": 0,
+                "answered_count": 0,
+                "correct_count": 0,
+                "earned": 0,
+                "current_qid": None,
+                "created_at": created_at,
+            }
+            heapq.heappush(self._session_expiry, (day, session_id))
+            self._touch("sessions", session_id)
+
+    def _update_session(self, session_id: str, **values):
+        with self._lock:
+            row = self._sessions.get(session_id)
+            if row is not None:
+                if "day" in values:
+                    heapq.heappush(self._session_expiry, (values["day"], session_id))
+                row.update(values)
+                self._touch("sessions", session_id)
+
+    def _inc_session(self, session_id: str, *deltas):
+        with self._lock:
+            row = self._sessions.get(session_id)
+            if row is not None:
+                for col, n in zip(COUNTERS, deltas):
+                    row[col] += n
+                self._touch("sessions", session_id)
+
+    def update_session_reset_daily(self, session_id: str, day: str):
+        self._update_session(
+            session_id, day=day, served_count=0, answered_count=0, correct_count=0, earned=0, current_qid=None
+        )
+
+    def set_child(self, session_id: str, child: str, group: str):
+        self._update_session(session_id, child=child, group_name=group)
+
+    def set_session_group(self, session_id: str, group: str):
+        self._update_session(session_id, group_name=group, child=None, current_qid=None)
+
+    def set_current_qid(self, session_id: str, qid):
+        self._update_session(session_id, current_qid=qid)
+
+    def inc_session_served(self, session_id: str, n: int = 1):
+        self._inc_session(session_id, n)
+
+    def inc_session_answered(self, session_id: str):
+        self._inc_session(session_id, 0, 1)
+
+    def inc_session_correct_earned(self, session_id: str, reward: int):
+        self._inc_session(session_id, 0, 0, 1, reward)
+
+    def logout_session(self, session_id: str):
+        self._update_session(session_id, child=None, current_qid=None)
+
+    # Maintenance
+    @staticmethod
+    def _pop_expired(heap, rows: dict, col: str, before: str, limit: int) -> list:
+        # key yang kedaluwarsa, paling lama dulu; cuma entry yang sudah lewat `before` yang disentuh
+        deleted = []
+        while heap and heap[0][0] < before and len(deleted) < limit:
+            value, key = heapq.heappop(heap)
+            row = rows.get(key)
+            if row is not None and row[col] == value:
+                del rows[key]
+                deleted.append(key)
+        return deleted
+
+    def delete_expired_sessions(self, before_day: str, limit: int) -> int:
+        with self._lock:
+            deleted = self._pop_expired(self._session_expiry, self._sessions, "day", before_day, limit)
+            self._touch("sessions", *deleted)
+            return len(deleted)
+
+    def delete_expired_tokens(self, before: str, limit: int) -> int:
+        with self._lock:
+            deleted = self._pop_expired(self._token_expiry, self._tokens, "answered_at", before, limit)
+            self._touch("answered_tokens", *deleted)
+            return len(deleted)
+
+    def auto_vacuum_mode(self) -> int:
+        # tidak ada file yang perlu dikecilkan: laporkan INCREMENTAL dengan freelist selalu kosong
+        return 2
+
+    def freelist_count(self) -> int:
+        return 0
+
+    def incremental_vacuum(self, pages: int):
+        pass
+
+    def convert_auto_vacuum(self):
+        pass
+
+    def optimize(self):
+        pass
+
+    def get_versions(self, scopes) -> list:
+        with self._lock:
+            return [self._versions.get(s, 0) for s in scopes]
+
+    def _bump_versions(self, scopes):
+        for s in set(scopes):
+            self._versions[s] = self._versions.get(s, 0) + 1
+
+    def bump_versions(self, scopes):
+        with self._lock:
+            self._bump_versions(scopes)
+
+    def new_data_epoch(self):
+        with self._lock:
+            self._versions[EPOCH_SCOPE] = secrets.randbits(62)
+
+    # child_daily + rollup (pengganti trigger SQLite)
+    def _bump_daily(self, child: str, day: str, deltas, create: bool):
+        row = self._daily.get(child, {}).get(day)
+        if row is None:
+            if not create:
+                return
+            row = self._daily.setdefault(child, {})[day] = {"child": child, "day": day, **dict.fromkeys(COUNTERS, 0)}
+        for col, n in zip(COUNTERS, deltas):
+            row[col] += n
+        for key in ((child, "week", _week_key(day)), (child, "month", day[:7]), (child, "all", "")):
+            acc = self._rollup.setdefault(key, [0, 0, 0, 0])
+            for i, n in enumerate(deltas):
+                acc[i] += n
+        self._touch("child_daily", (child, day))
+
+    def upsert_daily(self, child: str, day: str):
+        with self._lock:
+            self._bump_daily(child, day, (0, 0, 0, 0), create=True)
+
+    def inc_daily_served(self, child: str, day: str, n: int = 1):
+        with self._lock:
+            self._bump_daily(child, day, (n, 0, 0, 0), create=False)
+
+    def inc_daily_answered(self, child: str, day: str):
+        with self._lock:
+            self._bump_daily(child, day, (0, 1, 0, 0), create=False)
+
+    def inc_daily_correct_earned(self, child: str, day: str, reward: int):
+        with self._lock:
+            self._bump_daily(child, day, (0, 0, 1, reward), create=False)
+
+    def apply_counter_deltas(self, rows):
+        # rows: (session_id, child, day, served, answered, correct, earned)
+        with self._lock:
+            for session_id, child, day, *deltas in rows:
+                if session_id is not None:
+                    self._inc_session(session_id, *deltas)
+                self._bump_daily(child, day, deltas, create=True)
+            self._bump_versions(child for _, child, *_ in rows)
+
+    def select_daily_range(self, child: str, start_day: str, end_day: str):
+        with self._lock:
+            days = self._daily.get(child, {})
+            return [
+                {"day": d, **{c: days[d][c] for c in COUNTERS}}
+                for d in sorted(days)
+                if start_day <= d <= end_day
+            ]
+
+    def select_daily_since(self, start_day: str):
+        with self._lock:
+            return [dict(r) for days in self._daily.values() for d, r in days.items() if d >= start_day]
+
+    def select_range_totals(self, child: str, parts):
+        totals = [0, 0, 0, 0]
+        with self._lock:
+            days = self._daily.get(child, {})
+            for period, key in parts:
+                if period == "day":
+                    row = days.get(key)
+                    values = [row[c] for c in COUNTERS] if row else ()
+                else:
+                    values = self._rollup.get((child, period, key), ())
+                for i, n in enumerate(values):
+                    totals[i] += n
+        return totals
+
+    # answered_tokens
+    def claim_token(self, nonce: str, child: str, qid: str, answer: str, correct: bool, answered_at: str) -> bool:
+        with self._lock:
+            if nonce in self._tokens:
+                return False
+            self._tokens[nonce] = {
+                "nonce": nonce,
+                "child": child,
+                "qid": qid,
+                "answer": answer,
+                "correct": int(correct),
+                "answered_at": answered_at,
+            }
+            heapq.heappush(self._token_expiry, (answered_at, nonce))
+            self._touch("answered_tokens", nonce)
+            return True
+
+    def get_token_answer(self, nonce: str):
+        with self._lock:
+            row = self._tokens.get(nonce)
+            return dict(row) if row else None
+
+    # Export: daftar referensi diambil di bawah lock, salinan baris dibuat per batch
+    def _iter_rows(self, rows, batch: int):
+        for i in range(0, len(rows), batch):
+            with self._lock:
+                chunk = [dict(r) for r in rows[i:i + batch]]
+            yield chunk
+
+    @staticmethod
+    def _in_range(day: str, start_day, end_day) -> bool:
+        return (not start_day or day >= start_day) and (not end_day or day <= end_day)
+
+    def iter_daily(self, children, start_day=None, end_day=None, batch: int = 1000):
+        with self._lock:
+            rows = [
+                r
+                for child in children
+                for d, r in sorted(self._daily.get(child, {}).items())
+                if self._in_range(d, start_day, end_day)
+            ]
+        return self._iter_rows(rows, batch)
+
+    def iter_answer_events(self, children, start_day=None, end_day=None, batch: int = 1000):
+        wanted = set(children)
+        with self._lock:
+            rows = [r for r in self._events if r["child"] in wanted and self._in_range(r["day"], start_day, end_day)]
+        order = {child: i for i, child in enumerate(children)}
+        rows.sort(key=lambda r: (order[r["child"]], r["answered_at"], r["id"]))
+        return self._iter_rows(rows, batch)
+
+    # Answer events / mastery / kalibrasi
+    def insert_answer_events(self, rows):
+        cols = ("child", "day", "qid", "answer", "correct", "latency_ms", "answered_at")
+        with self._lock:
+            self._events.extend({"id": next(self._event_ids), **dict(zip(cols, r))} for r in rows)
+            self._touch()
+
+    def select_mastery(self, child: str):
+        with self._lock:
+            return [
+                (r["qid"], r["box"], r["due_at"], r["seen"], r["correct"])
+                for r in self._mastery.get(child, {}).values()
+            ]
+
+    def upsert_mastery(self, rows, updated_at: str):
+        with self._lock:
+            for child, qid, box, due_at, seen, correct in rows:
+                self._mastery.setdefault(child, {})[qid] = {
+                    "child": child,
+                    "qid": qid,
+                    "box": box,
+                    "due_at": due_at,
+                    "seen": seen,
+                    "correct": correct,
+                    "updated_at": updated_at,
+                }
+            self._touch("item_mastery", *((child, qid) for child, qid, *_ in rows))
+
+    def select_item_calibration(self, min_n: int = 0):
+        # kalibrasi sendiri (app.jobs.calibrate) jalan di SQLite; di sini cuma hasil dari snapshot
+        with self._lock:
+            return [(r["qid"], r["difficulty"], r["tier"], r["n"]) for r in self._calibration.values() if r["n"] >= min_n]
+
+    # Admin
+    def count_rows(self, tables) -> int:
+        with self._lock:
+            all_rows = self._tables()
+            return sum(len(all_rows.get(t, ())) for t in tables)
+
+    def clear_table_batch(self, table: str, limit: int) -> int:
+        # di memori satu tabel langsung habis; AdminService berhenti saat batch berikutnya 0
+        if table not in self.CLEAR_TABLES:
+            raise ValueError(f"tabel {table} tidak boleh dikosongkan")
+        with self._lock:
+            n = len(self._tables().get(table, ()))
+            if table == "sessions":
+                self._sessions = {}
+                self._session_expiry = []
+            elif table == "child_daily":
+                self._daily = {}
+            elif table == "child_rollup":
+                n = len(self._rollup)
+                self._rollup = {}
+            elif table == "answered_tokens":
+                self._tokens = {}
+                self._token_expiry = []
+            elif table == "answer_events":
+                self._events = []
+            elif table == "item_mastery":
+                self._mastery = {}
+            elif table == "item_calibration":
+                self._calibration = {}
+            if n and table in self.EPOCH_TABLES:
+                self._versions[EPOCH_SCOPE] = secrets.randbits(62)
+            self._full = True
+            self._touch()
+            return n
+
+    def backup_to(self, path: str, pages: int = 0, progress=None):
+        self.save(path)
+
+    def restore_from(self, path: str):
+        self.load(path)
+        # isi baru belum ada di file snapshot
+        with self._lock:
+            self._touch()
+
+    # Snapshot (file SQLite)
+    def save(self, path: str) -> int:
+        with self._save_lock:
+            if path == self.snapshot_path and not self._full and os.path.exists(path):
+                return self._save_changes(path)
+            return self._save_full(path)
+
+    def _save_changes(self, path: str) -> int:
+        # cuma baris yang berubah yang disalin di bawah lock; ditulis ke file di luar lock
+        with self._lock:
+            changes = self._changes
+            dirty, self._dirty = self._dirty, {}
+            upserts, deletes = {}, {}
+            for table, keys in dirty.items():
+                for key in keys:
+                    row = self._lookup(table, key)
+                    if row is None:
+                        deletes.setdefault(table, []).append(key if isinstance(key, tuple) else (key,))
+                    else:
+                        upserts.setdefault(table, []).append(dict(row))
+            events_from = self._events_saved
+            upserts["answer_events"] = [dict(r) for r in self._events[events_from:]]
+            self._events_saved = len(self._events)
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                for table, rows in upserts.items():
+                    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+                    cols = [r[1] for r in info]
+                    key = [r[1] for r in sorted(info, key=lambda r: r[5]) if r[5]]
+                    updates = ", ".join(f"{c} = excluded.{c}" for c in cols if c not in key)
+                    conn.executemany(
+                        f"INSERT INTO {table}({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+                        f"ON CONFLICT({', '.join(key)}) DO UPDATE SET {updates}",
+                        [tuple(r.get(c) for c in cols) for r in rows],
+                    )
+                for table, keys in deletes.items():
+                    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+                    key = [r[1] for r in sorted(info, key=lambda r: r[5]) if r[5]]
+                    conn.executemany(f"DELETE FROM {table} WHERE {' AND '.join(c + ' = ?' for c in key)}", keys)
+        except Exception:
+            with self._lock:
+                for table, keys in dirty.items():
+                    self._dirty.setdefault(table, set()).update(keys)
+                self._events_saved = min(self._events_saved, events_from)
+            raise
+        finally:
+            conn.close()
+        self._saved = changes
+        return sum(len(rows) for rows in upserts.values()) + sum(len(keys) for keys in deletes.values())
+
+    def _save_full(self, path: str) -> int:
+        own = path == self.snapshot_path
+        with self._lock:
+            changes = self._changes
+            tables = {name: [dict(r) for r in rows] for name, rows in self._tables().items()}
+            if own:
+                self._dirty = {}
+                self._events_saved = len(self._events)
+                self._full = False
+        tmp = path + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        try:
+            conn = sqlite3.connect(tmp)
+            try:
+                schema = Repo()
+                schema.init_db(conn)
+                schema.init_rollups(conn)
+                for name, rows in tables.items():
+                    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({name})")]
+                    conn.executemany(
+                        f"INSERT INTO {name}({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                        [tuple(r.get(c) for c in cols) for r in rows],
+                    )
+                conn.commit()
+            finally:
+                conn.close()
+            os.replace(tmp, path)
+        except Exception:
+            if own:
+                with self._lock:
+                    self._full = True
+            raise
+        if own:
+            self._saved = changes
+        return sum(len(rows) for rows in tables.values())
+
+    def load(self, path: str):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+            def rows(table):
+                return [dict(r) for r in conn.execute(f"SELECT * FROM {table}")] if table in names else []
+
+            with self._lock:
+                self._reset_tables()
+                for r in rows("sessions"):
+                    r.setdefault("answered_count", 0)
+                    self._sessions[r["session_id"]] = r
+                for r in rows("child_daily"):
+                    r.setdefault("answered_count", 0)
+                    self._bump_daily(r["child"], r["day"], [r[c] for c in COUNTERS], create=True)
+                self._tokens = {r["nonce"]: r for r in rows("answered_tokens")}
+                self._profiles = {r["name"]: r for r in rows("profiles")}
+                self._events = rows("answer_events")
+                self._event_ids = itertools.count(max((r["id"] for r in self._events), default=0) + 1)
+                for r in rows("item_mastery"):
+                    self._mastery.setdefault(r["child"], {})[r["qid"]] = r
+                self._calibration = {r["qid"]: r for r in rows("item_calibration")}
+                self._session_expiry = [(r["day"], sid) for sid, r in self._sessions.items() if r["day"] is not None]
+                heapq.heapify(self._session_expiry)
+                self._token_expiry = [(r["answered_at"], nonce) for nonce, r in self._tokens.items()]
+                heapq.heapify(self._token_expiry)
+                # _full tetap True dari _reset_tables(): skema file bisa lebih lama dari kode, jadi
+                # snapshot pertama setelah load selalu ditulis ulang penuh
+                self._changes = self._saved = 0
+        finally:
+            conn.close()
+        log.info("snapshot %s dimuat", path)
+
+    def _run(self):
+        while not self._stop.wait(self.snapshot_interval):
+            if self._changes == self._saved:
+                continue
+            try:
+                self.save(self.snapshot_path)
+            except Exception:
+                log.exception("snapshot %s gagal", self.snapshot_path)
+
+    def start(self):
+        if self.snapshot_path and self.snapshot_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="memory-snapshot", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.snapshot_path and self._changes != self._saved:
+            self.save(self.snapshot_path)
@@ -1,8 +1,45 @@
-from app.db.sqlite import db_conn
+import functools
+import secrets
+import sqlite3
+
+from app.db.sqlite import db_conn, commit, read_conn, rollback_stray, transaction
+
+# scope khusus di data_versions (nama anak tidak boleh berisi "/")
+EPOCH_SCOPE = "/epoch"
+PROFILES_SCOPE = "/profiles"
+
+
+def mutation(method):
+    # Kalau Repo punya writer, mutasi dikirim ke thread writer (group commit) dan ditunggu ack-nya.
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.writer is not None and not self.writer.owns_thread():
+            return self.writer.call(method, self, *args, **kwargs)
+        try:
+            return method(self, *args, **kwargs)
+        except BaseException:
+            rollback_stray()
+            raise
+    return wrapper
+
 
 class Repo:
-    def init_db(self):
-        conn = db_conn()
+    def __init__(self, writer=None):
+        self.writer = writer
+
+    def transaction(self):
+        return transaction()
+
+    def atomic(self, fn, *args, **kwargs):
+        # unit of work: satu transaksi, lewat writer kalau aktif
+        if self.writer is not None and not self.writer.owns_thread():
+            return self.writer.call(fn, *args, **kwargs)
+        with self.transaction():
+            return fn(*args, **kwargs)
+
+    def init_db(self, conn=None):
+        # conn: koneksi lain (mis. file snapshot MemoryRepo); default koneksi pool
+        conn = conn or db_conn()
         cur = conn.cursor()
 
         cur.execute(
@@ -10,6 +47,7 @@ class Repo:
             CREATE TABLE IF NOT EXISTS sessions (
               session_id TEXT PRIMARY KEY,
               child TEXT,
+              group_name TEXT,
               day TEXT,
               served_count INTEGER NOT NULL DEFAULT 0,
               answered_count INTEGER NOT NULL DEFAULT 0,
@@ -35,46 +73,344 @@ class Repo:
             """
         )
 
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answered_tokens (
+              nonce TEXT PRIMARY KEY,
+              child TEXT NOT NULL,
+              qid TEXT NOT NULL,
+              answer TEXT,
+              correct INTEGER NOT NULL,
+              answered_at TEXT NOT NULL
+            )
+            """
+        )
+
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS profiles (
+              name TEXT PRIMARY KEY,
+              display_name TEXT NOT NULL,
+              group_name TEXT NOT NULL,
+              bank_version INTEGER NOT NULL,
+              created_at TEXT NOT NULL
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_profiles_group ON profiles(group_name, name)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_day ON sessions(day)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_answered_tokens_at ON answered_tokens(answered_at)")
+
+        # append-only, satu baris per jawaban; ditulis batch oleh AnswerEventLog
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answer_events (
+              id INTEGER PRIMARY KEY,
+              child TEXT NOT NULL,
+              day TEXT NOT NULL,
+              qid TEXT NOT NULL,
+              answer TEXT,
+              correct INTEGER NOT NULL,
+              latency_ms INTEGER,
+              answered_at TEXT NOT NULL
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_answer_events_child_at ON answer_events(child, answered_at)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_answer_events_qid ON answer_events(qid, correct)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_answer_events_day_child ON answer_events(day, child)")
+
+        # state spaced repetition per anak per soal (lihat MasteryScheduler)
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS item_mastery (
+              child TEXT NOT NULL,
+              qid TEXT NOT NULL,
+              box INTEGER NOT NULL DEFAULT 0,
+              due_at REAL NOT NULL,
+              seen INTEGER NOT NULL DEFAULT 0,
+              correct INTEGER NOT NULL DEFAULT 0,
+              updated_at TEXT NOT NULL,
+              PRIMARY KEY (child, qid)
+            ) WITHOUT ROWID
+            """
+        )
+
+        # kalibrasi (python -m app.jobs.calibrate): agregat jawaban per child/qid + hasil fit
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS item_response_agg (
+              child TEXT NOT NULL,
+              qid TEXT NOT NULL,
+              n INTEGER NOT NULL,
+              correct INTEGER NOT NULL,
+              PRIMARY KEY (child, qid)
+            ) WITHOUT ROWID
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS calibration_state (
+              name TEXT PRIMARY KEY,
+              value INTEGER NOT NULL
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS item_calibration (
+              qid TEXT PRIMARY KEY,
+              difficulty REAL NOT NULL,
+              tier INTEGER NOT NULL,
+              n INTEGER NOT NULL,
+              updated_at TEXT NOT NULL
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS child_ability (
+              child TEXT PRIMARY KEY,
+              ability REAL NOT NULL,
+              n INTEGER NOT NULL,
+              updated_at TEXT NOT NULL
+            )
+            """
+        )
+
+        # versi data bersama semua worker (dasar ETag / ResponseCache), satu baris per scope:
+        # nama anak (naik di jalur tulis StatsService), PROFILES_SCOPE (profil / grup) dan
+        # EPOCH_SCOPE (angka acak, diganti setelah clear / restore supaya versi lama tidak cocok lagi).
+        # Versi pertama berupa satu baris global yang dinaikkan trigger; dibuang di sini.
+        for table in ("child_daily", "profiles"):
+            for event in ("insert", "update", "delete"):
+                cur.execute(f"DROP TRIGGER IF EXISTS {table}_version_{event}")
+        cur.execute("DROP TABLE IF EXISTS data_version")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS data_versions (
+              scope TEXT PRIMARY KEY,
+              version INTEGER NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        cur.execute(
+            "INSERT OR IGNORE INTO data_versions(scope, version) VALUES (?, ?)", (EPOCH_SCOPE, secrets.randbits(62))
+        )
+
+        conn.commit()
+
+    def init_rollups(self, conn=None):
+        # Rollup minggu (key = tanggal Senin), bulan (YYYY-MM) dan all-time per anak.
+        # Di-maintain trigger child_daily, jadi semua jalur tulis (inc_*, apply_counter_deltas) ikut.
+        own = conn is None
+        conn = conn or db_conn()
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS child_rollup (
+              child TEXT NOT NULL,
+              period TEXT NOT NULL,
+              key TEXT NOT NULL,
+              served_count INTEGER NOT NULL DEFAULT 0,
+              answered_count INTEGER NOT NULL DEFAULT 0,
+              correct_count INTEGER NOT NULL DEFAULT 0,
+              earned INTEGER NOT NULL DEFAULT 0,
+              PRIMARY KEY (child, period, key)
+            ) WITHOUT ROWID
+            """
+        )
+        for event, row, delta in (
+            ("INSERT", "NEW", "NEW.{0}"),
+            ("UPDATE OF served_count, answered_count, correct_count, earned", "NEW", "NEW.{0} - OLD.{0}"),
+        ):
+            cols = ", ".join(delta.format(c) for c in ("served_count", "answered_count", "correct_count", "earned"))
+            name = "child_daily_rollup_" + event.split()[0].lower()
+            cur.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON child_daily
+                BEGIN
+                  INSERT INTO child_rollup(child, period, key, served_count, answered_count, correct_count, earned)
+                  VALUES ({row}.child, 'week', date({row}.day, 'weekday 0', '-6 days'), {cols}),
+                         ({row}.child, 'month', substr({row}.day, 1, 7), {cols}),
+                         ({row}.child, 'all', '', {cols})
+                  ON CONFLICT(child, period, key) DO UPDATE SET
+                    served_count = served_count + excluded.served_count,
+                    answered_count = answered_count + excluded.answered_count,
+                    correct_count = correct_count + excluded.correct_count,
+                    earned = earned + excluded.earned;
+                END
+                """
+            )
         conn.commit()
-        conn.close()
+
+        # database lama: isi rollup sekali dari child_daily yang sudah ada
+        if own and cur.execute("SELECT 1 FROM child_rollup LIMIT 1").fetchone() is None:
+            if cur.execute("SELECT 1 FROM child_daily LIMIT 1").fetchone() is not None:
+                self.rebuild_rollups()
+
+    def rebuild_rollups(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM child_rollup")
+            for period, key in (
+                ("week", "date(day, 'weekday 0', '-6 days')"),
+                ("month", "substr(day, 1, 7)"),
+                ("all", "''"),
+            ):
+                conn.execute(
+                    f"""
+                    INSERT INTO child_rollup(child, period, key, served_count, answered_count, correct_count, earned)
+                    SELECT child, '{period}', {key}, sum(served_count), sum(answered_count), sum(correct_count), sum(earned)
+                    FROM child_daily
+                    GROUP BY child, {key}
+                    """
+                )
 
     def ensure_column(self, table: str, col: str, col_def: str):
         conn = db_conn()
         cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
         if col not in cols:
             conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_def}")
-            conn.commit()
-        conn.close()
+            commit(conn)
+
+    def migrate(self):
+        # startup dan setelah restore backup lama
+        self.init_db()
+        self.ensure_column("sessions", "answered_count", "INTEGER NOT NULL DEFAULT 0")
+        self.ensure_column("child_daily", "answered_count", "INTEGER NOT NULL DEFAULT 0")
+        self.ensure_column("sessions", "group_name", "TEXT")
+        self.init_rollups()
 
-    def clear_database(self):
+    # Admin clear (AdminService): dihapus per batch supaya lock tulis cepat dilepas; profiles dibiarkan
+    CLEAR_TABLES = (
+        "sessions", "child_daily", "child_rollup", "answered_tokens", "answer_events", "item_mastery",
+        "item_response_agg", "calibration_state", "item_calibration", "child_ability",
+    )
+    # isinya dipakai di ETag; mengosongkan salah satunya mengganti epoch
+    EPOCH_TABLES = ("child_daily", "child_rollup")
+
+    def _row_key(self, table: str) -> str:
+        # tabel WITHOUT ROWID dihapus lewat primary key-nya
         conn = db_conn()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM sessions")
-        cur.execute("DELETE FROM child_daily")
-        conn.commit()
-        cur.execute("VACUUM")
-        conn.commit()
-        conn.close()
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+        if "WITHOUT ROWID" not in sql.upper():
+            return "rowid"
+        pk = sorted((r["pk"], r["name"]) for r in conn.execute(f"PRAGMA table_info({table})") if r["pk"])
+        return ", ".join(name for _, name in pk)
+
+    def count_rows(self, tables) -> int:
+        conn = db_conn()
+        return sum(conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tables)
+
+    @mutation
+    def clear_table_batch(self, table: str, limit: int) -> int:
+        if table not in self.CLEAR_TABLES:
+            raise ValueError(f"tabel {table} tidak boleh dikosongkan")
+        key = self._row_key(table)
+        conn = db_conn()
+        cur = conn.execute(f"DELETE FROM {table} WHERE ({key}) IN (SELECT {key} FROM {table} LIMIT ?)", (limit,))
+        if cur.rowcount and table in self.EPOCH_TABLES:
+            # sekali per batch, bukan per baris
+            self._new_epoch(conn)
+        commit(conn)
+        return cur.rowcount
+
+    # Backup / restore (sqlite3 backup API)
+    def backup_to(self, path: str, pages: int, progress=None):
+        # salinan online per `pages` halaman; di WAL pembaca tidak menahan writer, jadi request tetap jalan.
+        # Kalau database diubah koneksi lain di tengah jalan, SQLite mengulang backup dari awal.
+        dst = sqlite3.connect(path)
+        try:
+            db_conn().backup(dst, pages=pages, progress=progress)
+        finally:
+            dst.close()
+
+    def restore_from(self, path: str):
+        # satu langkah (pages=-1): lock tulis dipegang sekali sampai semua halaman tersalin
+        src = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            src.backup(db_conn())
+        finally:
+            src.close()
+
+    @staticmethod
+    def check_backup(path: str) -> str:
+        # "ok" kalau file bisa dipakai restore
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'").fetchone() is None:
+                return "bukan database quiz"
+            return conn.execute("PRAGMA quick_check").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            return str(e)
+        finally:
+            conn.close()
+
+    # Profiles
+    def get_profile(self, name: str):
+        conn = db_conn()
+        row = conn.execute("SELECT * FROM profiles WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+
+    def select_profiles_by_group(self, group: str):
+        conn = db_conn()
+        rows = conn.execute("SELECT * FROM profiles WHERE group_name = ? ORDER BY name", (group,)).fetchall()
+        return [dict(r) for r in rows]
+
+    @mutation
+    def insert_profiles(self, rows):
+        # rows: (name, display_name, group_name, bank_version, created_at); yang sudah ada dibiarkan
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT INTO profiles(name, display_name, group_name, bank_version, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO NOTHING
+                """,
+                rows,
+            )
+            if conn.total_changes != before:
+                self._bump_versions(conn, [PROFILES_SCOPE])
+
+    @mutation
+    def upsert_profile(self, name: str, display_name: str, group: str, bank_version: int, created_at: str):
+        conn = db_conn()
+        conn.execute(
+            """
+            INSERT INTO profiles(name, display_name, group_name, bank_version, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+              display_name = excluded.display_name,
+              group_name = excluded.group_name,
+              bank_version = excluded.bank_version
+            """,
+            (name, display_name, group, bank_version, created_at),
+        )
+        self._bump_versions(conn, [PROFILES_SCOPE])
+        commit(conn)
 
     # Sessions
     def get_session(self, session_id: str):
         conn = db_conn()
         row = conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
-        conn.close()
         return dict(row) if row else None
 
+    # dua request pertama dengan cookie yang sama bisa balapan; yang kalah cukup diabaikan
+    @mutation
     def insert_session(self, session_id: str, day: str, created_at: str):
         conn = db_conn()
         conn.execute(
             """
             INSERT INTO sessions(session_id, child, day, served_count, answered_count, correct_count, earned, current_qid, created_at)
             VALUES (?, NULL, ?, 0, 0, 0, 0, NULL, ?)
+            ON CONFLICT(session_id) DO NOTHING
             """,
             (session_id, day, created_at),
         )
-        conn.commit()
-        conn.close()
+        commit(conn)
 
+    @mutation
     def update_session_reset_daily(self, session_id: str, day: str):
         conn = db_conn()
         conn.execute(
@@ -85,33 +421,43 @@ class Repo:
             """,
             (day, session_id),
         )
-        conn.commit()
-        conn.close()
+        commit(conn)
 
-    def set_child(self, session_id: str, child: str):
+    @mutation
+    def set_child(self, session_id: str, child: str, group: str):
         conn = db_conn()
-        conn.execute("UPDATE sessions SET child = ? WHERE session_id = ?", (child, session_id))
-        conn.commit()
-        conn.close()
+        conn.execute("UPDATE sessions SET child = ?, group_name = ? WHERE session_id = ?", (child, group, session_id))
+        commit(conn)
 
+    @mutation
+    def set_session_group(self, session_id: str, group: str):
+        # ganti grup = keluar dari anak yang sedang dipilih
+        conn = db_conn()
+        conn.execute(
+            "UPDATE sessions SET group_name = ?, child = NULL, current_qid = NULL WHERE session_id = ?",
+            (group, session_id),
+        )
+        commit(conn)
+
+    @mutation
     def set_current_qid(self, session_id: str, qid):
         conn = db_conn()
         conn.execute("UPDATE sessions SET current_qid = ? WHERE session_id = ?", (qid, session_id))
-        conn.commit()
-        conn.close()
+        commit(conn)
 
-    def inc_session_served(self, session_id: str):
+    @mutation
+    def inc_session_served(self, session_id: str, n: int = 1):
         conn = db_conn()
-        conn.execute("UPDATE sessions SET served_count = served_count + 1 WHERE session_id = ?", (session_id,))
-        conn.commit()
-        conn.close()
+        conn.execute("UPDATE sessions SET served_count = served_count + ? WHERE session_id = ?", (n, session_id))
+        commit(conn)
 
+    @mutation
     def inc_session_answered(self, session_id: str):
         conn = db_conn()
         conn.execute("UPDATE sessions SET answered_count = answered_count + 1 WHERE session_id = ?", (session_id,))
-        conn.commit()
-        conn.close()
+        commit(conn)
 
+    @mutation
     def inc_session_correct_earned(self, session_id: str, reward: int):
         conn = db_conn()
         conn.execute(
@@ -123,16 +469,96 @@ class Repo:
             """,
             (reward, session_id),
         )
-        conn.commit()
-        conn.close()
+        commit(conn)
 
+    @mutation
     def logout_session(self, session_id: str):
         conn = db_conn()
         conn.execute("UPDATE sessions SET child = NULL, current_qid = NULL WHERE session_id = ?", (session_id,))
-        conn.commit()
-        conn.close()
+        commit(conn)
+
+    # Maintenance (SessionJanitor): batch kecil per transaksi supaya lock writer cepat dilepas
+    @mutation
+    def delete_expired_sessions(self, before_day: str, limit: int) -> int:
+        conn = db_conn()
+        cur = conn.execute(
+            "DELETE FROM sessions WHERE rowid IN (SELECT rowid FROM sessions WHERE day < ? LIMIT ?)",
+            (before_day, limit),
+        )
+        commit(conn)
+        return cur.rowcount
+
+    @mutation
+    def delete_expired_tokens(self, before: str, limit: int) -> int:
+        conn = db_conn()
+        cur = conn.execute(
+            "DELETE FROM answered_tokens WHERE rowid IN (SELECT rowid FROM answered_tokens WHERE answered_at < ? LIMIT ?)",
+            (before, limit),
+        )
+        commit(conn)
+        return cur.rowcount
+
+    def auto_vacuum_mode(self) -> int:
+        # 0 = NONE, 1 = FULL, 2 = INCREMENTAL
+        return db_conn().execute("PRAGMA auto_vacuum").fetchone()[0]
+
+    def freelist_count(self) -> int:
+        return db_conn().execute("PRAGMA freelist_count").fetchone()[0]
+
+    def incremental_vacuum(self, pages: int):
+        # executescript menjalankan pragma sampai selesai (execute() cuma membebaskan satu halaman);
+        # tidak lewat writer karena executescript meng-commit transaksi yang sedang terbuka
+        db_conn().executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+
+    def convert_auto_vacuum(self):
+        # sekali untuk database lama (auto_vacuum NONE): pragma baru berlaku setelah VACUUM menulis
+        # ulang seluruh file; lock tulis dipegang sampai selesai
+        db_conn().executescript("PRAGMA auto_vacuum = INCREMENTAL; VACUUM")
+
+    def optimize(self):
+        db_conn().execute("PRAGMA optimize")
+
+    # data_versions
+    def get_versions(self, scopes) -> list:
+        # versi per scope sesuai urutan; scope yang belum pernah ditulis = 0
+        scopes = list(scopes)
+        rows = db_conn().execute(
+            f"SELECT scope, version FROM data_versions WHERE scope IN ({', '.join('?' * len(scopes))})", scopes
+        ).fetchall()
+        found = {r["scope"]: r["version"] for r in rows}
+        return [found.get(s, 0) for s in scopes]
+
+    @staticmethod
+    def _bump_versions(conn, scopes):
+        conn.executemany(
+            """
+            INSERT INTO data_versions(scope, version) VALUES (?, 1)
+            ON CONFLICT(scope) DO UPDATE SET version = version + 1
+            """,
+            [(s,) for s in sorted(set(scopes))],
+        )
+
+    @staticmethod
+    def _new_epoch(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO data_versions(scope, version) VALUES (?, ?)", (EPOCH_SCOPE, secrets.randbits(62))
+        )
+
+    @mutation
+    def bump_versions(self, scopes):
+        conn = db_conn()
+        self._bump_versions(conn, scopes)
+        commit(conn)
+
+    @mutation
+    def new_data_epoch(self):
+        # setelah restore: versi di file backup bisa lebih kecil dari ETag yang sudah beredar
+        conn = db_conn()
+        self._new_epoch(conn)
+        commit(conn)
 
     # child_daily
+    @mutation
     def upsert_daily(self, child: str, day: str):
         conn = db_conn()
         conn.execute(
@@ -143,27 +569,27 @@ class Repo:
             """,
             (child, day),
         )
-        conn.commit()
-        conn.close()
+        commit(conn)
 
-    def inc_daily_served(self, child: str, day: str):
+    @mutation
+    def inc_daily_served(self, child: str, day: str, n: int = 1):
         conn = db_conn()
         conn.execute(
-            "UPDATE child_daily SET served_count = served_count + 1 WHERE child = ? AND day = ?",
-            (child, day),
+            "UPDATE child_daily SET served_count = served_count + ? WHERE child = ? AND day = ?",
+            (n, child, day),
         )
-        conn.commit()
-        conn.close()
+        commit(conn)
 
+    @mutation
     def inc_daily_answered(self, child: str, day: str):
         conn = db_conn()
         conn.execute(
             "UPDATE child_daily SET answered_count = answered_count + 1 WHERE child = ? AND day = ?",
             (child, day),
         )
-        conn.commit()
-        conn.close()
+        commit(conn)
 
+    @mutation
     def inc_daily_correct_earned(self, child: str, day: str, reward: int):
         conn = db_conn()
         conn.execute(
@@ -175,8 +601,27 @@ class Repo:
             """,
             (reward, child, day),
         )
-        conn.commit()
-        conn.close()
+        commit(conn)
+
+    # answered_tokens: satu token soal cuma boleh dihitung sekali
+    @mutation
+    def claim_token(self, nonce: str, child: str, qid: str, answer: str, correct: bool, answered_at: str) -> bool:
+        conn = db_conn()
+        cur = conn.execute(
+            """
+            INSERT INTO answered_tokens(nonce, child, qid, answer, correct, answered_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(nonce) DO NOTHING
+            """,
+            (nonce, child, qid, answer, int(correct), answered_at),
+        )
+        commit(conn)
+        return cur.rowcount == 1
+
+    def get_token_answer(self, nonce: str):
+        conn = db_conn()
+        row = conn.execute("SELECT * FROM answered_tokens WHERE nonce = ?", (nonce,)).fetchone()
+        return dict(row) if row else None
 
     def select_daily_range(self, child: str, start_day: str, end_day: str):
         conn = db_conn()
@@ -191,5 +636,240 @@ class Repo:
             """,
             (child, start_day, end_day),
         ).fetchall()
-        conn.close()
-        return [dict(r) for r in rows]
\ No newline at end of file
+        return [dict(r) for r in rows]
+
+    def select_daily_since(self, start_day: str):
+        conn = db_conn()
+        rows = conn.execute(
+            """
+            SELECT child, day, served_count, answered_count, correct_count, earned
+            FROM child_daily
+            WHERE day >= ?
+            """,
+            (start_day,),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def select_range_totals(self, child: str, parts):
+        # parts: [(period, key)] dari StatsService.split_range; period "day" dibaca dari child_daily.
+        # Jumlah part dibatasi (beberapa hari + minggu + bulan), tidak tergantung panjang histori.
+        conn = db_conn()
+        days = [k for p, k in parts if p == "day"]
+        rolled = [(p, k) for p, k in parts if p != "day"]
+        totals = [0, 0, 0, 0]
+        queries = []
+        if days:
+            queries.append((
+                f"""
+                SELECT sum(served_count), sum(answered_count), sum(correct_count), sum(earned)
+                FROM child_daily WHERE child = ? AND day IN ({",".join("?" * len(days))})
+                """,
+                (child, *days),
+            ))
+        if rolled:
+            queries.append((
+                f"""
+                SELECT sum(served_count), sum(answered_count), sum(correct_count), sum(earned)
+                FROM child_rollup
+                WHERE child = ? AND (period, key) IN (VALUES {",".join(["(?, ?)"] * len(rolled))})
+                """,
+                (child, *(x for pk in rolled for x in pk)),
+            ))
+        for sql, params in queries:
+            row = conn.execute(sql, params).fetchone()
+            for i in range(4):
+                totals[i] += int(row[i] or 0)
+        return totals
+
+    # Answer events
+    @mutation
+    def insert_answer_events(self, rows):
+        # rows: (child, day, qid, answer, correct, latency_ms, answered_at)
+        with self.transaction() as conn:
+            conn.executemany(
+                """
+                INSERT INTO answer_events(child, day, qid, answer, correct, latency_ms, answered_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+
+    # Export (/api/export): generator batch sqlite3.Row dari cursor di koneksi baca sendiri, memori konstan
+    @staticmethod
+    def _iter_queries(queries, batch: int):
+        # semua query dalam satu transaksi baca = satu snapshot, walau dibaca bertahap
+        conn = read_conn()
+        try:
+            conn.execute("BEGIN")
+            for sql, params in queries:
+                cur = conn.execute(sql, params)
+                while True:
+                    rows = cur.fetchmany(batch)
+                    if not rows:
+                        break
+                    yield rows
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _day_filter(start_day, end_day):
+        where, params = "", []
+        if start_day:
+            where += " AND day >= ?"
+            params.append(start_day)
+        if end_day:
+            where += " AND day <= ?"
+            params.append(end_day)
+        return where, params
+
+    def iter_daily(self, children, start_day=None, end_day=None, batch: int = 1000):
+        where, params = self._day_filter(start_day, end_day)
+        sql = f"""
+            SELECT child, day, served_count, answered_count, correct_count, earned
+            FROM child_daily WHERE child = ?{where}
+            ORDER BY day
+        """
+        return self._iter_queries([(sql, (child, *params)) for child in children], batch)
+
+    def iter_answer_events(self, children, start_day=None, end_day=None, batch: int = 1000):
+        # per anak lewat index (child, answered_at): urutan ikut index, tidak ada temp B-tree untuk sort
+        where, params = self._day_filter(start_day, end_day)
+        sql = f"""
+            SELECT id, child, day, qid, answer, correct, latency_ms, answered_at
+            FROM answer_events INDEXED BY idx_answer_events_child_at
+            WHERE child = ?{where}
+            ORDER BY answered_at, id
+        """
+        return self._iter_queries([(sql, (child, *params)) for child in children], batch)
+
+    # Item mastery
+    def select_mastery(self, child: str):
+        conn = db_conn()
+        return conn.execute(
+            "SELECT qid, box, due_at, seen, correct FROM item_mastery WHERE child = ?", (child,)
+        ).fetchall()
+
+    @mutation
+    def upsert_mastery(self, rows, updated_at: str):
+        # rows: (child, qid, box, due_at, seen, correct)
+        with self.transaction() as conn:
+            conn.executemany(
+                """
+                INSERT INTO item_mastery(child, qid, box, due_at, seen, correct, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(child, qid) DO UPDATE SET
+                  box = excluded.box,
+                  due_at = excluded.due_at,
+                  seen = excluded.seen,
+                  correct = excluded.correct,
+                  updated_at = excluded.updated_at
+                """,
+                [(*r, updated_at) for r in rows],
+            )
+
+    # Calibration
+    @mutation
+    def fold_answer_events(self):
+        # tambahkan answer_events baru (id > watermark) ke item_response_agg; return (dari_id, sampai_id)
+        with self.transaction() as conn:
+            row = conn.execute("SELECT value FROM calibration_state WHERE name = 'answer_events'").fetchone()
+            lo = row[0] if row else 0
+            hi = conn.execute("SELECT max(id) FROM answer_events").fetchone()[0] or 0
+            if hi <= lo:
+                return lo, lo
+            conn.execute(
+                """
+                INSERT INTO item_response_agg(child, qid, n, correct)
+                SELECT child, qid, count(*), sum(correct) FROM answer_events
+                WHERE id > ? AND id <= ?
+                GROUP BY child, qid
+                ON CONFLICT(child, qid) DO UPDATE SET
+                  n = n + excluded.n,
+                  correct = correct + excluded.correct
+                """,
+                (lo, hi),
+            )
+            conn.execute(
+                """
+                INSERT INTO calibration_state(name, value) VALUES ('answer_events', ?)
+                ON CONFLICT(name) DO UPDATE SET value = excluded.value
+                """,
+                (hi,),
+            )
+            return lo, hi
+
+    @mutation
+    def reset_response_agg(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM item_response_agg")
+            conn.execute("DELETE FROM calibration_state WHERE name = 'answer_events'")
+
+    def select_response_agg(self):
+        conn = db_conn()
+        return conn.execute("SELECT child, qid, n, correct FROM item_response_agg").fetchall()
+
+    def select_child_ability(self):
+        conn = db_conn()
+        return conn.execute("SELECT child, ability, n FROM child_ability").fetchall()
+
+    def select_item_calibration(self, min_n: int = 0):
+        conn = db_conn()
+        return conn.execute(
+            "SELECT qid, difficulty, tier, n FROM item_calibration WHERE n >= ?", (min_n,)
+        ).fetchall()
+
+    @mutation
+    def save_calibration(self, items, children, updated_at: str):
+        # items: (qid, difficulty, tier, n); children: (child, ability, n)
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM item_calibration")
+            conn.execute("DELETE FROM child_ability")
+            conn.executemany(
+                "INSERT INTO item_calibration(qid, difficulty, tier, n, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(*r, updated_at) for r in items],
+            )
+            conn.executemany(
+                "INSERT INTO child_ability(child, ability, n, updated_at) VALUES (?, ?, ?, ?)",
+                [(*r, updated_at) for r in children],
+            )
+
+    @mutation
+    def apply_counter_deltas(self, rows):
+        # rows: (session_id, child, day, served, answered, correct, earned)
+        sessions = {}
+        daily = {}
+        for session_id, child, day, served, answered, correct, earned in rows:
+            for acc, key in ((sessions, session_id), (daily, (child, day))):
+                if key is None:
+                    continue
+                d = acc.setdefault(key, [0, 0, 0, 0])
+                d[0] += served
+                d[1] += answered
+                d[2] += correct
+                d[3] += earned
+
+        with self.transaction() as conn:
+            conn.executemany(
+                """
+                UPDATE sessions
+                SET served_count = served_count + ?,
+                    answered_count = answered_count + ?,
+                    correct_count = correct_count + ?,
+                    earned = earned + ?
+                WHERE session_id = ?
+                """,
+                [(*d, session_id) for session_id, d in sessions.items()],
+            )
+            conn.executemany(
+                """
+                INSERT INTO child_daily(child, day, served_count, answered_count, correct_count, earned)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(child, day) DO UPDATE SET
+                  served_count = served_count + excluded.served_count,
+                  answered_count = answered_count + excluded.answered_count,
+                  correct_count = correct_count + excluded.correct_count,
+                  earned = earned + excluded.earned
+                """,
+                [(child, day, *d) for (child, day), d in daily.items()],
+            )
+            self._bump_versions(conn, [child for child, _ in daily])
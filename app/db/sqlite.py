@@ -1,7 +1,113 @@
 import sqlite3
-from app.config import DB_PATH
+import threading
+from contextlib import contextmanager
+from app.config import DB_PATH, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_SYNCHRONOUS
+
+
+class ConnectionPool:
+    # Satu koneksi long-lived per thread. Thread FastAPI/uvicorn dipakai ulang,
+    # jadi jumlah koneksi ikut ukuran threadpool, bukan jumlah request.
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []
+        self._closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}")
+        # harus sebelum journal_mode: cuma berlaku untuk file baru (SessionJanitor -> incremental_vacuum)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            if conn.in_transaction and self.tx_depth() == 0:
+                # sisa statement yang gagal di luar transaction(): jangan biarkan lock tulis tertahan
+                conn.rollback()
+            return conn
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Connection pool sudah ditutup")
+            conn = self._connect()
+            self._conns.append(conn)
+        self._local.conn = conn
+        return conn
+
+    def tx_depth(self):
+        return getattr(self._local, "depth", 0)
+
+    def set_tx_depth(self, depth: int):
+        self._local.depth = depth
+
+    def close_all(self):
+        with self._lock:
+            self._closed = True
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+pool = ConnectionPool(DB_PATH)
+
 
 def db_conn():
-    conn = sqlite3.connect(DB_PATH)
+    return pool.get()
+
+
+def read_conn():
+    # Koneksi baca sendiri di luar pool untuk cursor yang lama hidup (export). Di WAL satu SELECT
+    # memegang snapshot baca sampai cursor habis, tanpa menahan writer. Boleh dipakai bergantian
+    # dari thread berbeda (tidak bersamaan).
+    conn = sqlite3.connect(
+        f"file:{DB_PATH}?mode=ro", uri=True, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False
+    )
     conn.row_factory = sqlite3.Row
-    return conn
\ No newline at end of file
+    return conn
+
+
+def close_all():
+    pool.close_all()
+
+
+@contextmanager
+def transaction():
+    # Nested transaction() ikut transaksi terluar; commit cuma sekali di akhir.
+    conn = db_conn()
+    depth = pool.tx_depth()
+    if depth == 0:
+        conn.execute("BEGIN IMMEDIATE")
+    pool.set_tx_depth(depth + 1)
+    try:
+        yield conn
+    except BaseException:
+        pool.set_tx_depth(depth)
+        if depth == 0:
+            conn.rollback()
+        raise
+    pool.set_tx_depth(depth)
+    if depth == 0:
+        conn.commit()
+
+
+def commit(conn):
+    if pool.tx_depth() == 0:
+        conn.commit()
+
+
+def rollback_stray():
+    # dipanggil saat mutasi gagal di luar transaction(): batalkan transaksi implisit yang terbuka
+    conn = getattr(pool._local, "conn", None)
+    if conn is not None and conn.in_transaction and pool.tx_depth() == 0:
+        conn.rollback()
@@ -0,0 +1,76 @@
+from typing import Optional, Protocol
+
+from app.config import STORAGE, MEMORY_SNAPSHOT_PATH, MEMORY_SNAPSHOT_INTERVAL_S
+from app.db.memory import MemoryRepo
+from app.db.repo import Repo
+
+
+class Storage(Protocol):
+    # Kontrak penyimpanan yang dipakai service. Implementasi: Repo (SQLite, app.db.repo) dan
+    # MemoryRepo (dict + lock, app.db.memory). Baris dikembalikan sebagai dict / tuple biasa.
+    CLEAR_TABLES: tuple
+
+    def atomic(self, fn, *args, **kwargs): ...
+    def migrate(self): ...
+
+    # sessions
+    def get_session(self, session_id: str) -> Optional[dict]: ...
+    def insert_session(self, session_id: str, day: str, created_at: str): ...
+    def update_session_reset_daily(self, session_id: str, day: str): ...
+    def set_child(self, session_id: str, child: str, group: str): ...
+    def set_session_group(self, session_id: str, group: str): ...
+    def set_current_qid(self, session_id: str, qid): ...
+    def inc_session_served(self, session_id: str, n: int = 1): ...
+    def inc_session_answered(self, session_id: str): ...
+    def inc_session_correct_earned(self, session_id: str, reward: int): ...
+    def logout_session(self, session_id: str): ...
+
+    # child_daily + stats
+    def upsert_daily(self, child: str, day: str): ...
+    def inc_daily_served(self, child: str, day: str, n: int = 1): ...
+    def inc_daily_answered(self, child: str, day: str): ...
+    def inc_daily_correct_earned(self, child: str, day: str, reward: int): ...
+    def apply_counter_deltas(self, rows): ...
+    def select_daily_range(self, child: str, start_day: str, end_day: str) -> list: ...
+    def select_daily_since(self, start_day: str) -> list: ...
+    def select_range_totals(self, child: str, parts) -> list: ...
+
+    # token, profil, event jawaban, mastery
+    def claim_token(self, nonce: str, child: str, qid: str, answer: str, correct: bool, answered_at: str) -> bool: ...
+    def get_token_answer(self, nonce: str) -> Optional[dict]: ...
+    def get_profile(self, name: str) -> Optional[dict]: ...
+    def select_profiles_by_group(self, group: str) -> list: ...
+    def insert_profiles(self, rows): ...
+    def upsert_profile(self, name: str, display_name: str, group: str, bank_version: int, created_at: str): ...
+    def insert_answer_events(self, rows): ...
+    def select_mastery(self, child: str) -> list: ...
+    def upsert_mastery(self, rows, updated_at: str): ...
+    def select_item_calibration(self, min_n: int = 0) -> list: ...
+
+    # export: generator batch baris (bisa diindeks nama kolom)
+    def iter_daily(self, children, start_day=None, end_day=None, batch: int = 1000): ...
+    def iter_answer_events(self, children, start_day=None, end_day=None, batch: int = 1000): ...
+
+    # maintenance / admin
+    def delete_expired_sessions(self, before_day: str, limit: int) -> int: ...
+    def delete_expired_tokens(self, before: str, limit: int) -> int: ...
+    def auto_vacuum_mode(self) -> int: ...
+    def freelist_count(self) -> int: ...
+    def incremental_vacuum(self, pages: int): ...
+    def convert_auto_vacuum(self): ...
+    def optimize(self): ...
+    def get_versions(self, scopes) -> list: ...
+    def bump_versions(self, scopes): ...
+    def new_data_epoch(self): ...
+    def count_rows(self, tables) -> int: ...
+    def clear_table_batch(self, table: str, limit: int) -> int: ...
+    def backup_to(self, path: str, pages: int, progress=None): ...
+    def restore_from(self, path: str): ...
+    def check_backup(self, path: str) -> str: ...
+
+
+def open_storage(writer=None) -> Storage:
+    # STORAGE=sqlite (default) atau memory; writer (DB_WRITER) cuma berlaku untuk SQLite
+    if STORAGE == "memory":
+        return MemoryRepo(MEMORY_SNAPSHOT_PATH, MEMORY_SNAPSHOT_INTERVAL_S)
+    return Repo(writer)
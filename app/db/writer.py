@@ -0,0 +1,116 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from app.db.sqlite import transaction
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteQueue:
+    # Satu thread writer per proses yang memegang semua mutasi. Perintah yang masuk
+    # berdekatan di-commit bersama (group commit); tiap perintah dibungkus SAVEPOINT
+    # supaya satu error tidak membatalkan perintah lain di batch yang sama.
+    def __init__(self, max_batch: int, max_wait_ms: float):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closed = False
+        self.batches = 0
+        self.commands = 0
+
+    def owns_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        fut = Future()
+        self._queue.put((fn, args, kwargs, fut))
+        return fut
+
+    def call(self, fn, *args, **kwargs):
+        if self._closed or self._thread is None:
+            with transaction():
+                return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _apply(self, batch):
+        results = []
+        try:
+            with transaction() as conn:
+                for fn, args, kwargs, fut in batch:
+                    conn.execute("SAVEPOINT cmd")
+                    try:
+                        res = fn(*args, **kwargs)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO cmd")
+                        conn.execute("RELEASE cmd")
+                        results.append((fut, None, e))
+                        continue
+                    conn.execute("RELEASE cmd")
+                    results.append((fut, res, None))
+        except Exception as e:
+            log.exception("group commit gagal (%d perintah)", len(batch))
+            for _, _, _, fut in batch:
+                fut.set_exception(e)
+            return
+
+        self.batches += 1
+        self.commands += len(batch)
+        for fut, res, err in results:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(res)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._apply(batch)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        # perintah yang sempat masuk setelah STOP dijalankan langsung di sini
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            self._apply(leftover)
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+from array import array
+
+from app.domain.question_bank import BANK_SPECS, DIFFICULTIES, QuestionBank, generate_bank_add_sub
+
+log = logging.getLogger(__name__)
+
+# Naikkan kalau logika generate_bank_add_sub berubah -> snapshot lama otomatis dibuang
+GENERATOR_VERSION = 1
+
+MAGIC = b"KMQB"
+FORMAT_VERSION = 2
+# magic, format, bank version, jumlah soal, itemsize int, params digest, payload sha256
+HEADER = struct.Struct("<4sHHIB32s32s")
+
+# urutan kolom di payload
+COLUMNS = (("a", "i"), ("b", "i"), ("op", "b"), ("op2", "b"), ("c", "i"), ("answer", "i"), ("difficulty", "b"))
+
+
+def params_digest(qver: int, spec: dict, generator: str) -> bytes:
+    key = json.dumps({"generator": [generator, GENERATOR_VERSION], "qver": qver, **spec}, sort_keys=True)
+    return hashlib.sha256(key.encode()).digest()
+
+
+def snapshot_path(cache_dir: str, qver: int, digest: bytes) -> str:
+    return os.path.join(cache_dir, f"bank_v{qver}_{digest.hex()[:16]}.bin")
+
+
+def _to_bytes(col: array) -> bytes:
+    if sys.byteorder != "little":
+        col = array(col.typecode, col)
+        col.byteswap()
+    return col.tobytes()
+
+
+def dump(bank: QuestionBank, digest: bytes) -> bytes:
+    cols = [getattr(bank, name) for name, _ in COLUMNS] + list(bank.tiers)
+    payload = b"".join(_to_bytes(c) for c in cols)
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        bank.version,
+        len(bank),
+        array("i").itemsize,
+        digest,
+        hashlib.sha256(payload).digest(),
+    )
+    tier_sizes = struct.pack(f"<{len(DIFFICULTIES)}I", *(len(t) for t in bank.tiers))
+    return header + tier_sizes + payload
+
+
+def load(data: bytes, qver: int, digest: bytes):
+    # None kalau file rusak / beda parameter -> caller generate ulang
+    if len(data) < HEADER.size:
+        return None
+    magic, fmt, ver, count, itemsize, file_digest, checksum = HEADER.unpack_from(data)
+    if magic != MAGIC or fmt != FORMAT_VERSION or ver != qver or file_digest != digest:
+        return None
+    if itemsize != array("i").itemsize:
+        return None
+
+    view = memoryview(data)
+    off = HEADER.size
+    tier_fmt = struct.Struct(f"<{len(DIFFICULTIES)}I")
+    if len(data) < off + tier_fmt.size:
+        return None
+    tier_sizes = tier_fmt.unpack_from(data, off)
+    off += tier_fmt.size
+
+    if hashlib.sha256(view[off:]).digest() != checksum:
+        return None
+
+    cols = {}
+    for name, typecode in COLUMNS:
+        cols[name] = _read(view, off, typecode, count)
+        off += count * cols[name].itemsize
+    tiers = []
+    for n in tier_sizes:
+        tiers.append(_read(view, off, "I", n))
+        off += n * tiers[-1].itemsize
+    if off != len(data):
+        return None
+
+    return QuestionBank(qver, tiers=tuple(tiers), **cols)
+
+
+def _read(view: memoryview, off: int, typecode: str, count: int) -> array:
+    col = array(typecode)
+    col.frombytes(view[off:off + count * col.itemsize])
+    if sys.byteorder != "little":
+        col.byteswap()
+    return col
+
+
+def load_or_build(qver: int, spec: dict, build_fn, cache_dir: str) -> QuestionBank:
+    digest = params_digest(qver, spec, build_fn.__name__)
+    path = snapshot_path(cache_dir, qver, digest)
+
+    try:
+        with open(path, "rb") as f:
+            bank = load(f.read(), qver, digest)
+        if bank is not None:
+            return bank
+        log.warning("snapshot bank v%s tidak valid, generate ulang", qver)
+    except FileNotFoundError:
+        pass
+
+    bank = build_fn(qver, **spec)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(dump(bank, digest))
+        os.replace(tmp, path)
+    except OSError:
+        log.exception("gagal menyimpan snapshot bank v%s", qver)
+    return bank
+
+
+def load_banks(cache_dir: str):
+    return (
+        load_or_build(1, BANK_SPECS[1], generate_bank_add_sub, cache_dir),
+        load_or_build(2, BANK_SPECS[2], generate_bank_add_sub, cache_dir),
+    )
@@ -0,0 +1,134 @@
+from array import array
+
+import numpy as np
+
+from app.domain.question_bank import EASY, MEDIUM, HARD, NO_OP, QuestionBank
+
+ADD, SUB, MUL, DIV = range(4)
+
+# name, op, range a, range b, op2, range c, bobot
+# - DIV: a dibentuk dari b * hasil, jadi range a di sini = range hasil bagi
+# - soal dua langkah cuma +/- supaya tetap dibaca kiri ke kanan
+DEFAULT_BULK_RULES = (
+    ("add", ADD, (1, 999), (1, 999), NO_OP, (0, 0), 20),
+    ("sub", SUB, (10, 999), (1, 999), NO_OP, (0, 0), 20),
+    ("mul", MUL, (2, 999), (2, 12), NO_OP, (0, 0), 15),
+    ("div", DIV, (2, 999), (2, 12), NO_OP, (0, 0), 15),
+    ("add_sub", ADD, (1, 50), (1, 50), SUB, (1, 50), 15),
+    ("sub_add", SUB, (20, 99), (1, 20), ADD, (1, 50), 15),
+)
+
+_MAX_OPERAND = 1 << 16
+
+
+def _apply(op: int, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    if op == ADD:
+        return x + y
+    if op == SUB:
+        return x - y
+    if op == MUL:
+        return x * y
+    return x // y
+
+
+def _pack_keys(a, op, b, op2, c) -> np.ndarray:
+    # satu int64 per soal untuk dedup: op/op2 di bit atas, lalu a, b, c 16 bit
+    hi = np.int64(op) * 8 + np.int64(op2 + 1)
+    return ((hi * _MAX_OPERAND + a) * _MAX_OPERAND + b) * _MAX_OPERAND + c
+
+
+def _contains(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool)
+    pos = np.searchsorted(sorted_keys, keys)
+    return sorted_keys[np.minimum(pos, len(sorted_keys) - 1)] == keys
+
+
+def difficulty_tiers(answer: np.ndarray, multi_step: np.ndarray, op: np.ndarray) -> np.ndarray:
+    # threshold sama dengan difficulty_from_answer (10/20/50), lalu naik satu
+    # tingkat untuk soal dua langkah dan perkalian/pembagian dengan hasil > 20
+    tier = np.where(answer <= 10, EASY, np.where(answer >= 50, HARD, MEDIUM))
+    bump = multi_step | (((op == MUL) | (op == DIV)) & (answer > 20))
+    return np.minimum(tier + bump, HARD).astype(np.int8)
+
+
+def _sample_rule(rng, rule, n: int):
+    _, op, (a_lo, a_hi), (b_lo, b_hi), op2, (c_lo, c_hi), _ = rule
+    a = rng.integers(a_lo, a_hi + 1, n, dtype=np.int64)
+    b = rng.integers(b_lo, b_hi + 1, n, dtype=np.int64)
+    c = rng.integers(c_lo, c_hi + 1, n, dtype=np.int64)
+    if op == DIV:
+        a = a * b
+    answer = _apply(op, a, b)
+    mask = answer >= 0
+    if op2 != NO_OP:
+        answer = _apply(op2, answer, c)
+        mask &= answer >= 0
+    else:
+        c = np.zeros(n, dtype=np.int64)
+    mask &= (a < _MAX_OPERAND) & (b < _MAX_OPERAND) & (c < _MAX_OPERAND)
+    return a[mask], b[mask], c[mask], answer[mask]
+
+
+def generate_bulk_bank(qver: int, *, seed: int, target_size: int, rules=DEFAULT_BULK_RULES) -> QuestionBank:
+    # Deterministik per seed: kuota per rule tetap, sampling per batch dengan np.random.Generator.
+    # Rule yang ruang operandnya habis, sisa kuotanya dibagi ke rule lain di putaran berikut.
+    rng = np.random.default_rng(seed)
+    taken = np.empty(0, dtype=np.int64)
+    cols = {k: [] for k in ("a", "b", "c", "op", "op2", "answer")}
+    active = list(rules)
+    total = 0
+
+    for _ in range(4):
+        missing = target_size - total
+        if missing <= 0 or not active:
+            break
+        total_weight = sum(r[-1] for r in active)
+        quotas = [missing * r[-1] // total_weight for r in active]
+        quotas[0] += missing - sum(quotas)
+
+        exhausted = []
+        for rule, quota in zip(active, quotas):
+            op, op2 = rule[1], rule[4]
+            got = 0
+            for _ in range(20):
+                need = quota - got
+                if need <= 0:
+                    break
+                a, b, c, answer = _sample_rule(rng, rule, max(need * 2, 1024))
+                keys = _pack_keys(a, op, b, op2, c)
+                # unik di dalam batch (urutan kemunculan pertama) dan belum pernah dipakai
+                _, first = np.unique(keys, return_index=True)
+                first.sort()
+                first = first[~_contains(taken, keys[first])][:need]
+                if not len(first):
+                    break
+                taken = np.sort(np.concatenate([taken, keys[first]]))
+                cols["a"].append(a[first])
+                cols["b"].append(b[first])
+                cols["c"].append(c[first])
+                cols["answer"].append(answer[first])
+                cols["op"].append(np.full(len(first), op, dtype=np.int8))
+                cols["op2"].append(np.full(len(first), op2, dtype=np.int8))
+                got += len(first)
+            if got < quota:
+                exhausted.append(rule)
+            total += got
+        active = [r for r in active if r not in exhausted]
+
+    out = {k: np.concatenate(v) if v else np.empty(0, dtype=np.int64) for k, v in cols.items()}
+    difficulty = difficulty_tiers(out["answer"], out["op2"] != NO_OP, out["op"])
+    tiers = tuple(array("I", np.flatnonzero(difficulty == t).astype(np.uint32).tobytes()) for t in (EASY, MEDIUM, HARD))
+
+    return QuestionBank(
+        qver,
+        a=array("i", out["a"].astype(np.int32).tobytes()),
+        b=array("i", out["b"].astype(np.int32).tobytes()),
+        op=array("b", out["op"].astype(np.int8).tobytes()),
+        op2=array("b", out["op2"].astype(np.int8).tobytes()),
+        c=array("i", out["c"].astype(np.int32).tobytes()),
+        answer=array("i", out["answer"].astype(np.int32).tobytes()),
+        difficulty=array("b", difficulty.tobytes()),
+        tiers=tiers,
+    )
+
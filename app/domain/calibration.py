@@ -0,0 +1,47 @@
+import numpy as np
+
+from app.domain.question_bank import EASY, MEDIUM, HARD
+
+# batas tier dari difficulty Rasch (logit, rata-rata soal = 0)
+EASY_MAX = -0.5
+HARD_MIN = 0.5
+
+
+def fit_rasch(child_idx, item_idx, n, k, n_children: int, n_items: int, *, ability=None, difficulty=None,
+              prior_var: float = 1.0, max_iter: int = 100, tol: float = 1e-4):
+    # Rasch: P(benar) = sigmoid(ability[child] - difficulty[item]), dari agregat (n percobaan, k benar)
+    # per pasangan child/item. Newton per parameter (Hessian diagonal) bergantian child lalu item,
+    # prior N(0, prior_var) supaya anak/soal yang selalu benar/salah tetap punya estimasi hingga.
+    # ability/difficulty lama dipakai sebagai titik awal untuk re-run inkremental.
+    n = np.asarray(n, dtype=np.float64)
+    k = np.asarray(k, dtype=np.float64)
+    theta = np.zeros(n_children) if ability is None else np.asarray(ability, dtype=np.float64).copy()
+    beta = np.zeros(n_items) if difficulty is None else np.asarray(difficulty, dtype=np.float64).copy()
+    inv_var = 1.0 / prior_var
+
+    for it in range(max_iter):
+        p = 1.0 / (1.0 + np.exp(beta[item_idx] - theta[child_idx]))
+        grad = np.bincount(child_idx, k - n * p, n_children) - theta * inv_var
+        hess = np.bincount(child_idx, n * p * (1 - p), n_children) + inv_var
+        step_t = np.clip(grad / hess, -1.0, 1.0)
+        theta += step_t
+
+        p = 1.0 / (1.0 + np.exp(beta[item_idx] - theta[child_idx]))
+        grad = np.bincount(item_idx, n * p - k, n_items) - beta * inv_var
+        hess = np.bincount(item_idx, n * p * (1 - p), n_items) + inv_var
+        step_b = np.clip(grad / hess, -1.0, 1.0)
+        beta += step_b
+
+        # skala relatif: rata-rata difficulty soal = 0
+        shift = beta.mean()
+        beta -= shift
+        theta -= shift
+
+        if max(np.abs(step_t).max(initial=0), np.abs(step_b).max(initial=0)) < tol:
+            break
+
+    return theta, beta, it + 1
+
+
+def tiers_from_difficulty(difficulty: np.ndarray) -> np.ndarray:
+    return np.where(difficulty <= EASY_MAX, EASY, np.where(difficulty >= HARD_MIN, HARD, MEDIUM)).astype(np.int8)
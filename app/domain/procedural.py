@@ -0,0 +1,108 @@
+from app.domain.question_bank import (
+    BANK_SPECS,
+    DIFFICULTIES,
+    OP_NAMES,
+    OPERAND_RULES,
+    OPS,
+    apply_op,
+    difficulty_from_answer,
+)
+from app.security import sign, unsign
+
+
+class ProceduralBank:
+    # Soal dibuat on the fly dari aturan operand yang sama dengan bank statis.
+    # qid = "p{ver}.{op}.{a}.{b}" (+ HMAC), jadi jawaban bisa dicek tanpa tabel.
+    __slots__ = ("version", "signed", "rules", "weights", "tier_rules")
+
+    def __init__(self, version: int, signed: bool = True):
+        spec = BANK_SPECS[version]
+        self.version = version
+        self.signed = signed
+        self.rules = [(a_rng, op, b_rng) for name, a_rng, op, b_rng in OPERAND_RULES if spec.get(name)]
+        self.weights = [spec[name] for name, _, _, _ in OPERAND_RULES if spec.get(name)]
+        # rule mana saja yang bisa menghasilkan tiap tier (dihitung sekali, range-nya kecil)
+        tier_rules = []
+        for t in range(len(DIFFICULTIES)):
+            pairs = [(r, w) for r, w in zip(self.rules, self.weights) if self._rule_has_tier(r, t)]
+            tier_rules.append(([r for r, _ in pairs], [w for _, w in pairs]))
+        self.tier_rules = tuple(tier_rules)
+
+    @staticmethod
+    def _rule_has_tier(rule, tier: int) -> bool:
+        (a_lo, a_hi), op, (b_lo, b_hi) = rule
+        name = DIFFICULTIES[tier]
+        for a in range(a_lo, a_hi + 1):
+            for b in range(b_lo, b_hi + 1):
+                if op == "-" and a < b:
+                    continue
+                if difficulty_from_answer(apply_op(a, op, b)) == name:
+                    return True
+        return False
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def has_tier(self, tier: int) -> bool:
+        return bool(self.tier_rules[tier][0])
+
+    def _sample(self, rng, rules, weights, tier=None):
+        for _ in range(200):
+            (a_lo, a_hi), op, (b_lo, b_hi) = rng.choices(rules, weights)[0]
+            a, b = rng.randint(a_lo, a_hi), rng.randint(b_lo, b_hi)
+            if op == "-" and a < b:
+                continue
+            if tier is None or difficulty_from_answer(apply_op(a, op, b)) == DIFFICULTIES[tier]:
+                return a, op, b
+        return None
+
+    def pick(self, rng, *tiers):
+        for t in tiers:
+            rules, weights = self.tier_rules[t]
+            if rules:
+                q = self._sample(rng, rules, weights, t)
+                if q:
+                    return q
+        return self._sample(rng, self.rules, self.weights)
+
+    def qid(self, q) -> str:
+        a, op, b = q
+        value = f"p{self.version}.{OP_NAMES[OPS.index(op)]}.{a}.{b}"
+        return sign(value) if self.signed else value
+
+    def prompt(self, q) -> str:
+        a, op, b = q
+        return f"{a} {op} {b} = ?"
+
+    def find(self, qid: str):
+        value = unsign(qid) if self.signed else qid
+        if not value:
+            return None
+        parts = value.split(".")
+        if len(parts) != 4 or parts[0] != f"p{self.version}" or parts[1] not in OP_NAMES:
+            return None
+        if not (parts[2].isdigit() and parts[3].isdigit()):
+            return None
+        q = int(parts[2]), OPS[OP_NAMES.index(parts[1])], int(parts[3])
+        # qid tanpa tanda tangan bisa dikarang klien (mis. div dengan b=0): operand harus bisa
+        # dihasilkan salah satu rule bank ini, kalau tidak dianggap soal tidak dikenal (400)
+        return q if self._valid(q) else None
+
+    def _valid(self, q) -> bool:
+        a, op, b = q
+        if op == "-" and a < b:
+            return False
+        return any(
+            rop == op and a_lo <= a <= a_hi and b_lo <= b <= b_hi for (a_lo, a_hi), rop, (b_lo, b_hi) in self.rules
+        )
+
+    def get(self, q) -> dict:
+        a, op, b = q
+        ans = apply_op(a, op, b)
+        return {
+            "id": self.qid(q),
+            "prompt": self.prompt(q),
+            "answer": ans,
+            "difficulty": difficulty_from_answer(ans),
+            "op": OP_NAMES[OPS.index(op)],
+        }
@@ -1,4 +1,11 @@
 import random
+from array import array
+
+OPS = ("+", "-", "×", ":")
+OP_NAMES = ("add", "sub", "mul", "div")
+NO_OP = -1
+DIFFICULTIES = ("easy", "medium", "hard")
+EASY, MEDIUM, HARD = range(3)
 
 def difficulty_from_answer(ans: int) -> str:
     if ans <= 10:
@@ -9,23 +16,115 @@ def difficulty_from_answer(ans: int) -> str:
         return "hard"
     return "medium"
 
-def make_q(qver: int, idx: int, a: int, op: str, b: int) -> dict:
+def apply_op(a: int, op: str, b: int) -> int:
     if op == "+":
-        ans = a + b
-        prompt = f"{a} + {b} = ?"
-    elif op == "-":
-        ans = a - b
-        prompt = f"{a} - {b} = ?"
-    else:
-        raise ValueError("op must be '+' or '-'")
-
-    return {
-        "id": f"v{qver}_q{idx:04d}",
-        "prompt": prompt,
-        "answer": ans,
-        "difficulty": difficulty_from_answer(ans),
-        "op": "add" if op == "+" else "sub",
-    }
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "×":
+        return a * b
+    if op == ":":
+        if b == 0 or a % b:
+            raise ValueError("pembagian harus habis")
+        return a // b
+    raise ValueError(f"op tidak dikenal: {op!r}")
+
+def parse_qid(qid: str):
+    # "v2_q0137" -> (2, 136)
+    ver, sep, num = (qid or "").partition("_q")
+    if not sep or not ver.startswith("v") or not ver[1:].isdigit() or not num.isdigit():
+        return None, None
+    return int(ver[1:]), int(num) - 1
+
+
+class QuestionBank:
+    # Bank immutable: kolom disimpan sebagai typed array, plus index per difficulty
+    # supaya pick() O(1) tanpa filter ulang.
+    # Soal dua langkah (a op b op2 c) pakai kolom op2/c; op2 = NO_OP untuk soal biasa.
+    __slots__ = ("version", "a", "b", "op", "op2", "c", "answer", "difficulty", "tiers")
+
+    def __init__(
+        self,
+        version: int,
+        a: array,
+        b: array,
+        op: array,
+        answer: array,
+        difficulty: array,
+        op2: array = None,
+        c: array = None,
+        tiers=None,
+    ):
+        self.version = version
+        self.a = a
+        self.b = b
+        self.op = op
+        self.op2 = op2 if op2 is not None else array("b", [NO_OP]) * len(a)
+        self.c = c if c is not None else array("i", [0]) * len(a)
+        self.answer = answer
+        self.difficulty = difficulty
+        if tiers is None:
+            tiers = tuple(array("I", (i for i, d in enumerate(difficulty) if d == t)) for t in range(len(DIFFICULTIES)))
+        self.tiers = tiers
+
+    @classmethod
+    def from_operands(cls, version: int, items):
+        a, b, op, answer, difficulty = array("i"), array("i"), array("b"), array("i"), array("b")
+        for x, o, y in items:
+            ans = apply_op(x, o, y)
+            a.append(x)
+            b.append(y)
+            op.append(OPS.index(o))
+            answer.append(ans)
+            difficulty.append(DIFFICULTIES.index(difficulty_from_answer(ans)))
+        return cls(version, a, b, op, answer, difficulty)
+
+    def __len__(self):
+        return len(self.answer)
+
+    def qid(self, i: int) -> str:
+        return f"v{self.version}_q{i + 1:04d}"
+
+    def prompt(self, i: int) -> str:
+        if self.op2[i] != NO_OP:
+            return f"{self.a[i]} {OPS[self.op[i]]} {self.b[i]} {OPS[self.op2[i]]} {self.c[i]} = ?"
+        return f"{self.a[i]} {OPS[self.op[i]]} {self.b[i]} = ?"
+
+    def find(self, qid: str):
+        ver, i = parse_qid(qid)
+        if ver != self.version or i is None or not (0 <= i < len(self)):
+            return None
+        return i
+
+    def has_tier(self, tier: int) -> bool:
+        return len(self.tiers[tier]) > 0
+
+    def pick(self, rng, *tiers):
+        # tier pertama yang tidak kosong, sama seperti `easy or med or bank`
+        for t in tiers:
+            idx = self.tiers[t]
+            if idx:
+                return idx[rng.randrange(len(idx))]
+        return rng.randrange(len(self))
+
+    def with_tiers(self, overrides: dict):
+        # bank baru (kolom soal dipakai bersama) dengan difficulty sebagian soal diganti, mis. hasil kalibrasi
+        difficulty = array("b", self.difficulty)
+        for i, tier in overrides.items():
+            difficulty[i] = tier
+        return QuestionBank(
+            self.version, self.a, self.b, self.op, self.answer, difficulty, op2=self.op2, c=self.c
+        )
+
+    def get(self, i: int) -> dict:
+        return {
+            "id": self.qid(i),
+            "prompt": self.prompt(i),
+            "answer": self.answer[i],
+            "difficulty": DIFFICULTIES[self.difficulty[i]],
+            "op": OP_NAMES[self.op[i]] if self.op2[i] == NO_OP else f"{OP_NAMES[self.op[i]]}_{OP_NAMES[self.op2[i]]}",
+        }
+
 
 def generate_bank_add_sub(
     qver: int,
@@ -38,23 +137,19 @@ def generate_bank_add_sub(
     teen_sub: int,
     two_digit_sub_v1: int,
     two_digit_sub_v2: int,
-) -> list[dict]:
+) -> QuestionBank:
     rng = random.Random(seed)
     seen = set()
     out = []
-    idx = 1
 
     def add_unique(a: int, op: str, b: int):
-        nonlocal idx
         key = (a, op, b)
         if key in seen:
             return False
         if op == "-" and a < b:
             return False
-        q = make_q(qver, idx, a, op, b)
         seen.add(key)
-        out.append(q)
-        idx += 1
+        out.append(key)
         return True
 
     def fill(quota: int, gen_fn):
@@ -83,11 +178,10 @@ def generate_bank_add_sub(
         return (rng.randint(10, 20), "-", rng.randint(1, 9))
 
     fill(max(0, target_size - len(out)), topping)
-    return out[:target_size]
+    return QuestionBank.from_operands(qver, out[:target_size])
 
-def build_banks():
-    bank_v1 = generate_bank_add_sub(
-        1,
+BANK_SPECS = {
+    1: dict(
         seed=101,
         target_size=400,
         single_digit_add=50,
@@ -96,10 +190,8 @@ def build_banks():
         teen_sub=100,
         two_digit_sub_v1=70,
         two_digit_sub_v2=30,
-    )
-
-    bank_v2 = generate_bank_add_sub(
-        2,
+    ),
+    2: dict(
         seed=202,
         target_size=400,
         single_digit_add=20,
@@ -108,7 +200,20 @@ def build_banks():
         teen_sub=130,
         two_digit_sub_v1=30,
         two_digit_sub_v2=70,
-    )
+    ),
+}
 
-    q_by_id = {q["id"]: q for q in (bank_v1 + bank_v2)}
-    return bank_v1, bank_v2, q_by_id
\ No newline at end of file
+# (quota di BANK_SPECS, range a, op, range b) -- sama dengan fill() di generate_bank_add_sub
+OPERAND_RULES = (
+    ("single_digit_add", (1, 9), "+", (1, 9)),
+    ("single_digit_sub", (1, 9), "-", (1, 9)),
+    ("teen_add", (10, 20), "+", (1, 9)),
+    ("teen_sub", (10, 20), "-", (1, 9)),
+    ("two_digit_sub_v1", (20, 60), "-", (1, 20)),
+    ("two_digit_sub_v2", (20, 99), "-", (1, 50)),
+)
+
+def build_banks():
+    bank_v1 = generate_bank_add_sub(1, **BANK_SPECS[1])
+    bank_v2 = generate_bank_add_sub(2, **BANK_SPECS[2])
+    return bank_v1, bank_v2
@@ -0,0 +1,79 @@
+import argparse
+import logging
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.config import CALIBRATION_MIN_RESPONSES
+from app.db.repo import Repo
+from app.db.sqlite import close_all
+from app.domain.calibration import fit_rasch, tiers_from_difficulty
+
+log = logging.getLogger(__name__)
+
+
+def calibrate(repo: Repo, full: bool = False, max_iter: int = 100):
+    # 1) answer_events baru dilipat ke item_response_agg (inkremental lewat watermark id)
+    # 2) fit Rasch atas agregat child x qid, mulai dari hasil run sebelumnya
+    # 3) tulis item_calibration + child_ability; QuestionService membacanya saat start
+    if full:
+        repo.reset_response_agg()
+    lo, hi = repo.fold_answer_events()
+
+    rows = repo.select_response_agg()
+    if not rows:
+        return {"events": hi - lo, "pairs": 0, "items": 0, "children": 0, "iterations": 0}
+
+    child_names, child_idx = np.unique(np.array([r[0] for r in rows]), return_inverse=True)
+    qids, item_idx = np.unique(np.array([r[1] for r in rows]), return_inverse=True)
+    n = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+    k = np.fromiter((r[3] for r in rows), dtype=np.float64, count=len(rows))
+
+    prev_b = {qid: d for qid, d, _, _ in repo.select_item_calibration()}
+    prev_t = {child: a for child, a, _ in repo.select_child_ability()}
+    difficulty = np.array([prev_b.get(q, 0.0) for q in qids])
+    ability = np.array([prev_t.get(c, 0.0) for c in child_names])
+
+    ability, difficulty, iters = fit_rasch(
+        child_idx, item_idx, n, k, len(child_names), len(qids),
+        ability=ability, difficulty=difficulty, max_iter=max_iter,
+    )
+
+    item_n = np.bincount(item_idx, n, len(qids)).astype(np.int64)
+    child_n = np.bincount(child_idx, n, len(child_names)).astype(np.int64)
+    tiers = tiers_from_difficulty(difficulty)
+    repo.save_calibration(
+        zip(qids.tolist(), difficulty.tolist(), tiers.tolist(), item_n.tolist()),
+        zip(child_names.tolist(), ability.tolist(), child_n.tolist()),
+        datetime.now().isoformat(timespec="seconds"),
+    )
+    return {
+        "events": hi - lo,
+        "pairs": len(rows),
+        "items": len(qids),
+        "children": len(child_names),
+        "iterations": iters,
+        "calibrated": int((item_n >= CALIBRATION_MIN_RESPONSES).sum()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kalibrasi difficulty soal dan ability anak dari answer_events")
+    parser.add_argument("--full", action="store_true", help="bangun ulang agregat dari seluruh answer_events")
+    parser.add_argument("--max-iter", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    repo = Repo()
+    repo.init_db()
+    t0 = time.perf_counter()
+    try:
+        res = calibrate(repo, full=args.full, max_iter=args.max_iter)
+    finally:
+        close_all()
+    log.info("kalibrasi selesai dalam %.2fs: %s", time.perf_counter() - t0, res)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,79 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import RedirectResponse, JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.staticfiles import StaticFiles
 
-from app.config import APP_TITLE
-from app.db.repo import Repo
+from app.config import (
+    APP_TITLE,
+    COUNTER_BUFFER,
+    COUNTER_FLUSH_INTERVAL_S,
+    COUNTER_FLUSH_MAX_OPS,
+    EVENT_LOG,
+    EVENT_FLUSH_INTERVAL_S,
+    EVENT_FLUSH_MAX_ROWS,
+    MASTERY_SCHEDULER,
+    MASTERY_FLUSH_INTERVAL_S,
+    CALIBRATION_MIN_RESPONSES,
+    RESPONSE_CACHE_SIZE,
+    STATS_STREAM,
+    STORAGE,
+    JANITOR,
+    JANITOR_INTERVAL_S,
+    SESSION_TTL_DAYS,
+    JANITOR_BATCH,
+    JANITOR_VACUUM_PAGES,
+    QUESTION_TOKEN_TTL_S,
+    RECAP_CACHE,
+    RECAP_CACHE_DAYS,
+    QUESTION_MODE,
+    QID_SIGNED,
+    BANK_CACHE_DIR,
+    BULK_BANK_SIZE,
+    BULK_BANK_SEED,
+    DB_THREADS,
+    DB_WRITER,
+    DB_WRITER_MAX_BATCH,
+    DB_WRITER_MAX_WAIT_MS,
+)
+from app.db.storage import open_storage
+from app.db.sqlite import close_all
+from app.db.executor import DbExecutor
+from app.db.writer import WriteQueue
 from app.domain.question_bank import build_banks
+from app.domain.bank_snapshot import load_banks, load_or_build
+from app.domain.bulk_generator import DEFAULT_BULK_RULES, generate_bulk_bank
+from app.domain.procedural import ProceduralBank
+from app.services.profile_service import ProfileService
 from app.services.session_service import SessionService
 from app.services.stats_service import StatsService
+from app.services.counter_buffer import CounterBuffer
+from app.services.event_log import AnswerEventLog
+from app.services.mastery import MasteryScheduler
+from app.services.stats_bus import StatsBus
+from app.services.janitor import SessionJanitor
+from app.services.recap_cache import RecapCache
 from app.services.question_service import QuestionService
+from app.services.admin_jobs import AdminJobs
 from app.services.admin_service import AdminService
+from app.services.export_service import ExportService
+from app.web.response_cache import ResponseCache
 from app.api.routes import build_router
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for task in app.state.background:
+        task.start()
+    yield
+    for task in reversed(app.state.background):
+        task.close()
+    close_all()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI(title=APP_TITLE)
+    app = FastAPI(title=APP_TITLE, lifespan=lifespan)
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
     async def _handle_404(request: Request):
@@ -43,19 +102,88 @@ def create_app() -> FastAPI:
             return await _handle_404(request)
         return JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
 
-    repo = Repo()
-    repo.init_db()
-    repo.ensure_column("sessions", "answered_count", "INTEGER NOT NULL DEFAULT 0")
-    repo.ensure_column("child_daily", "answered_count", "INTEGER NOT NULL DEFAULT 0")
+    writer = WriteQueue(DB_WRITER_MAX_BATCH, DB_WRITER_MAX_WAIT_MS) if DB_WRITER and STORAGE == "sqlite" else None
+    repo = open_storage(writer)
+    repo.migrate()
+
+    if QUESTION_MODE == "procedural":
+        bank_v1, bank_v2 = ProceduralBank(1, QID_SIGNED), ProceduralBank(2, QID_SIGNED)
+    elif BANK_CACHE_DIR:
+        bank_v1, bank_v2 = load_banks(BANK_CACHE_DIR)
+    else:
+        bank_v1, bank_v2 = build_banks()
+
+    extra_banks = []
+    if BULK_BANK_SIZE > 0:
+        spec = dict(seed=BULK_BANK_SEED, target_size=BULK_BANK_SIZE, rules=DEFAULT_BULK_RULES)
+        if BANK_CACHE_DIR:
+            extra_banks.append(load_or_build(3, spec, generate_bulk_bank, BANK_CACHE_DIR))
+        else:
+            extra_banks.append(generate_bulk_bank(3, **spec))
 
-    bank_v1, bank_v2, q_by_id = build_banks()
+    db_executor = DbExecutor(DB_THREADS)
+    # ditutup dari belakang: buffer flush dulu, lalu executor, terakhir writer
+    app.state.background = [writer, db_executor] if writer else [db_executor]
+    if STORAGE == "memory":
+        # ditutup paling akhir: snapshot terakhir setelah semua buffer flush
+        app.state.background.insert(0, repo)
+
+    counter_buffer = None
+    if COUNTER_BUFFER:
+        counter_buffer = CounterBuffer(repo, COUNTER_FLUSH_INTERVAL_S, COUNTER_FLUSH_MAX_OPS)
+        app.state.background.append(counter_buffer)
+
+    event_log = None
+    if EVENT_LOG:
+        event_log = AnswerEventLog(repo, EVENT_FLUSH_INTERVAL_S, EVENT_FLUSH_MAX_ROWS)
+        app.state.background.append(event_log)
+
+    scheduler = None
+    if MASTERY_SCHEDULER:
+        scheduler = MasteryScheduler(repo, MASTERY_FLUSH_INTERVAL_S)
+        app.state.background.append(scheduler)
+
+    if JANITOR:
+        app.state.background.append(
+            SessionJanitor(repo, JANITOR_INTERVAL_S, SESSION_TTL_DAYS, QUESTION_TOKEN_TTL_S, JANITOR_BATCH, JANITOR_VACUUM_PAGES)
+        )
 
     session_svc = SessionService(repo)
-    stats_svc = StatsService(repo)
-    q_svc = QuestionService(stats_svc, bank_v1, bank_v2, q_by_id)
-    admin_svc = AdminService(repo)
+    profile_svc = ProfileService(repo)
+    profile_svc.seed_defaults()
+    stats_svc = StatsService(
+        repo,
+        counter_buffer,
+        RecapCache(RECAP_CACHE_DAYS) if RECAP_CACHE else None,
+        event_log,
+        StatsBus() if STATS_STREAM else None,
+    )
+    stats_svc.warm_cache()
+    q_svc = QuestionService(stats_svc, bank_v1, bank_v2, extra_banks, scheduler, profile_svc)
+    q_svc.apply_calibration((qid, tier) for qid, _, tier, _ in repo.select_item_calibration(CALIBRATION_MIN_RESPONSES))
+    # terakhir di background: job yang masih jalan dihentikan sebelum writer / executor ditutup
+    admin_jobs = AdminJobs()
+    app.state.background.append(admin_jobs)
+    admin_svc = AdminService(repo, stats_svc, scheduler, profile_svc, admin_jobs, q_svc.banks)
+
+    @app.middleware("http")
+    async def session_cookie(request: Request, call_next):
+        response = await call_next(request)
+        ctx = getattr(request.state, "session", None)
+        if ctx is not None:
+            session_svc.apply_cookie(ctx, response)
+        return response
 
-    app.include_router(build_router(session_svc, stats_svc, q_svc, admin_svc))
+    app.include_router(build_router(
+            session_svc,
+            stats_svc,
+            q_svc,
+            admin_svc,
+            db_executor,
+            ResponseCache(RESPONSE_CACHE_SIZE),
+            profile_svc,
+            ExportService(repo),
+        ))
     return app
 
 
@@ -0,0 +1,40 @@
+import base64
+import hashlib
+import hmac
+import json
+
+from app.config import SECRET_KEY
+
+_KEY = SECRET_KEY.encode()
+
+
+def _mac(value: str, size: int) -> str:
+    digest = hmac.new(_KEY, value.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")[:size]
+
+
+def sign(value: str, size: int = 16) -> str:
+    return f"{value}.{_mac(value, size)}"
+
+
+def unsign(token: str, size: int = 16):
+    value, sep, mac = (token or "").rpartition(".")
+    if not sep or not hmac.compare_digest(mac, _mac(value, size)):
+        return None
+    return value
+
+
+def dumps(obj) -> str:
+    # JSON ringkas -> base64url -> ditandatangani; aman untuk cookie / URL
+    raw = json.dumps(obj, separators=(",", ":")).encode()
+    return sign(base64.urlsafe_b64encode(raw).decode().rstrip("="))
+
+
+def loads(token: str):
+    payload = unsign(token)
+    if not payload:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except ValueError:
+        return None
@@ -0,0 +1,95 @@
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class AdminJobs:
+    # Job maintenance admin (clear / backup / restore) di thread sendiri supaya request langsung balik (202).
+    # Cuma satu job jalan sekaligus; status di-poll lewat /api/admin/jobs/{id}. Riwayat terakhir disimpan di memori.
+    def __init__(self, keep: int = 20):
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    def current(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return dict(self._jobs[self._thread.name])
+        return None
+
+    def submit(self, kind: str, fn):
+        # fn(update, stop) -> dict hasil; update(progress 0..1, message). None kalau masih ada job lain.
+        with self._lock:
+            if self._stop.is_set() or (self._thread is not None and self._thread.is_alive()):
+                return None
+            job = {
+                "id": secrets.token_hex(8),
+                "kind": kind,
+                "state": "running",
+                "progress": 0.0,
+                "message": "",
+                "result": None,
+                "started_at": self._now(),
+                "finished_at": None,
+            }
+            self._jobs[job["id"]] = job
+            while len(self._jobs) > self.keep:
+                self._jobs.popitem(last=False)
+            self._thread = threading.Thread(target=self._run, args=(job, fn), name=job["id"], daemon=True)
+            self._thread.start()
+            return dict(job)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update(self, job: dict, progress: float, message: str = None):
+        if self._stop.is_set():
+            raise JobCancelled("dibatalkan karena server berhenti")
+        with self._lock:
+            job["progress"] = round(min(max(progress, 0.0), 1.0), 3)
+            if message is not None:
+                job["message"] = message
+
+    def _run(self, job: dict, fn):
+        try:
+            result = fn(lambda progress, message=None: self._update(job, progress, message), self._stop)
+            state, message = "done", None
+        except JobCancelled as e:
+            result, state, message = None, "cancelled", str(e)
+        except Exception as e:
+            log.exception("job admin %s gagal", job["kind"])
+            result, state, message = None, "failed", str(e)
+        with self._lock:
+            job["state"] = state
+            job["result"] = result
+            if state == "done":
+                job["progress"] = 1.0
+            if message is not None:
+                job["message"] = message
+            job["finished_at"] = self._now()
+
+    def start(self):
+        pass
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
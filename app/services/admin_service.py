@@ -1,12 +1,201 @@
-from app.config import ADMIN_CLEAR_PASSWORD
-from app.db.repo import Repo
+import os
+import re
+from datetime import datetime
+from typing import Optional
+
+from app.config import (
+    ADMIN_CLEAR_PASSWORD,
+    ADMIN_CLEAR_BATCH,
+    BACKUP_DIR,
+    BACKUP_PAGES,
+    BACKUP_MAX_RESTARTS,
+    JANITOR_VACUUM_PAGES,
+    PROFILE_DEFAULT_GROUP,
+)
+from app.db.storage import Storage
+from app.services.admin_jobs import AdminJobs
+from app.services.janitor import release_free_pages
+from app.services.profile_service import ProfileService
+from app.services.stats_service import StatsService
+
+BACKUP_NAME = re.compile(r"^[A-Za-z0-9_.-]+\.sqlite3$")
+
+
+class _BackupRestarted(Exception):
+    pass
+
 
 class AdminService:
-    def __init__(self, repo: Repo):
+    def __init__(
+        self,
+        repo: Storage,
+        stats: StatsService,
+        scheduler=None,
+        profiles: Optional[ProfileService] = None,
+        jobs: Optional[AdminJobs] = None,
+        bank_versions=(),
+    ):
         self.repo = repo
+        self.stats = stats
+        self.scheduler = scheduler
+        self.profiles = profiles
+        self.jobs = jobs or AdminJobs()
+        # versi bank yang dimuat (QuestionService.banks); kosong = tidak dicek
+        self.bank_versions = tuple(sorted(bank_versions))
+
+    @staticmethod
+    def check_password(password: str) -> bool:
+        return (password or "").strip() == ADMIN_CLEAR_PASSWORD
+
+    def _flush_pending(self):
+        # buffer write-behind ditulis dulu supaya backup memuat jawaban terakhir
+        for part in (self.stats.buffer, self.stats.events, self.scheduler):
+            if part:
+                part.flush()
+
+    def _reset_memory(self):
+        self.stats.reset()
+        if self.scheduler:
+            self.scheduler.reset()
+        if self.profiles:
+            self.profiles.reset()
+
+    # Job: password dicek route (401); None = masih ada job lain (409)
+    def start_clear(self):
+        return self.jobs.submit("clear", self._clear)
+
+    def start_backup(self):
+        return self.jobs.submit("backup", self._backup)
+
+    def start_restore(self, name: str):
+        path = self.backup_path(name)
+        if path is None:
+            raise ValueError("Backup tidak ditemukan.")
+        return self.jobs.submit("restore", lambda update, stop: self._restore(path, update, stop))
+
+    def start_vacuum(self):
+        return self.jobs.submit("vacuum", self._vacuum)
+
+    def job(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def _clear(self, update, stop) -> dict:
+        # buffer dibuang dulu supaya tidak ditulis ulang di tengah clear
+        self._reset_memory()
+        total = self.repo.count_rows(self.repo.CLEAR_TABLES) or 1
+        deleted = 0
+        for table in self.repo.CLEAR_TABLES:
+            while True:
+                n = self.repo.clear_table_batch(table, ADMIN_CLEAR_BATCH)
+                deleted += n
+                update(0.9 * deleted / total, f"Menghapus {table}...")
+                if n < ADMIN_CLEAR_BATCH:
+                    break
+                stop.wait(0.01)
+        self._reset_memory()
+        update(0.9, "Mengembalikan ruang kosong...")
+        pages = release_free_pages(self.repo, JANITOR_VACUUM_PAGES, stop)
+        self.repo.optimize()
+        update(1.0, "Database sudah dikosongkan.")
+        return {"rows": deleted, "pages": pages}
+
+    def _vacuum(self, update, stop) -> dict:
+        # konversi sekali ke auto_vacuum INCREMENTAL supaya janitor / clear bisa mengecilkan file
+        if self.repo.auto_vacuum_mode() == 2:
+            update(1.0, "auto_vacuum sudah INCREMENTAL.")
+            return {"converted": False}
+        update(0.1, "Menulis ulang database (VACUUM)...")
+        self.repo.convert_auto_vacuum()
+        mode = self.repo.auto_vacuum_mode()
+        if mode != 2:
+            raise RuntimeError(f"auto_vacuum masih {mode} setelah VACUUM")
+        update(1.0, "Database sudah dikonversi ke auto_vacuum INCREMENTAL.")
+        return {"converted": True}
+
+    # Backup
+    def backup_path(self, name: str) -> Optional[str]:
+        if not name or not BACKUP_NAME.match(name):
+            return None
+        path = os.path.join(BACKUP_DIR, name)
+        return path if os.path.isfile(path) else None
+
+    def list_backups(self) -> list:
+        if not os.path.isdir(BACKUP_DIR):
+            return []
+        out = []
+        for name in sorted(os.listdir(BACKUP_DIR), reverse=True):
+            path = os.path.join(BACKUP_DIR, name)
+            if BACKUP_NAME.match(name) and os.path.isfile(path):
+                st = os.stat(path)
+                out.append({
+                    "name": name,
+                    "size": st.st_size,
+                    "created_at": datetime.fromtimestamp(st.st_mtime).isoformat(timespec="seconds"),
+                })
+        return out
+
+    def _backup(self, update, stop) -> dict:
+        self._flush_pending()
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        name = datetime.now().strftime("math_app-%Y%m%d-%H%M%S.sqlite3")
+        path = os.path.join(BACKUP_DIR, name)
+        tmp = path + ".part"
+        seen = {"remaining": None, "restarts": 0}
+
+        def progress(status, remaining, total):
+            # remaining naik lagi = SQLite mengulang dari awal karena ada tulisan baru
+            if seen["remaining"] is not None and remaining > seen["remaining"]:
+                seen["restarts"] += 1
+                if seen["restarts"] > BACKUP_MAX_RESTARTS:
+                    raise _BackupRestarted()
+            seen["remaining"] = remaining
+            update(0.95 * (total - remaining) / max(total, 1), "Menyalin halaman...")
+
+        try:
+            try:
+                self.repo.backup_to(tmp, BACKUP_PAGES, progress)
+            except _BackupRestarted:
+                # terlalu sering diulang: salin dalam satu snapshot baca (WAL, writer tetap jalan)
+                update(0.5, "Menyalin dalam satu langkah...")
+                self.repo.backup_to(tmp, -1)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        update(1.0, "Backup selesai.")
+        return {"name": name, "size": os.path.getsize(path), "restarts": seen["restarts"]}
+
+    def _restore(self, path: str, update, stop) -> dict:
+        update(0.05, "Memeriksa backup...")
+        check = self.repo.check_backup(path)
+        if check != "ok":
+            raise ValueError(f"Backup rusak: {check}")
+        # jawaban yang masih di buffer milik data lama, jadi dibuang
+        self._reset_memory()
+        update(0.2, "Memulihkan database...")
+        self.repo.restore_from(path)
+        # backup lama mungkin belum punya tabel / kolom terbaru
+        self.repo.migrate()
+        self.repo.new_data_epoch()
+        self._reset_memory()
+        self.stats.warm_cache()
+        update(1.0, "Database sudah dipulihkan.")
+        return {"name": os.path.basename(path)}
 
-    def clear_db(self, password: str) -> tuple[bool, str]:
-        if (password or "").strip() != ADMIN_CLEAR_PASSWORD:
-            return False, "Password salah."
-        self.repo.clear_database()
-        return True, "Database sudah dikosongkan."
\ No newline at end of file
+    def upsert_profile(self, body: dict) -> tuple[bool, str, dict]:
+        # password dicek route lewat check_password (401), di sini cuma validasi isi
+        name = str(body.get("name") or "").strip().lower()
+        if not name or "/" in name:
+            return False, "Nama profil tidak valid.", {}
+        old = self.profiles.get(name) or {}
+        try:
+            bank_version = int(body.get("bank_version") or old.get("bank_version") or 1)
+        except (TypeError, ValueError):
+            return False, "bank_version harus angka.", {}
+        if self.bank_versions and bank_version not in self.bank_versions:
+            versions = ", ".join(map(str, self.bank_versions))
+            return False, f"bank_version {bank_version} tidak ada (tersedia: {versions}).", {}
+        display_name = str(body.get("display_name") or old.get("display_name") or name.capitalize())
+        group = str(body.get("group") or old.get("group_name") or PROFILE_DEFAULT_GROUP)
+        profile = self.profiles.upsert(name, display_name, group, bank_version)
+        return True, "Profil disimpan.", profile
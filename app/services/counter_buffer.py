@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+SERVED, ANSWERED, CORRECT, EARNED = range(4)
+
+
+class CounterBuffer:
+    # Write-behind untuk counter served/answered/correct/earned.
+    # Delta dikumpulkan per (session, child, day) lalu di-flush dalam satu transaksi.
+    def __init__(self, repo, flush_interval: float, max_pending: int):
+        self.repo = repo
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._ops = 0
+        # genap = tidak ada flush yang sedang commit (lihat read_consistent)
+        self._generation = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, session_id, child: str, day: str, served=0, answered=0, correct=0, earned=0):
+        with self._lock:
+            d = self._pending.get((session_id, child, day))
+            if d is None:
+                d = self._pending[(session_id, child, day)] = [0, 0, 0, 0]
+            d[SERVED] += served
+            d[ANSWERED] += answered
+            d[CORRECT] += correct
+            d[EARNED] += earned
+            self._ops += 1
+            full = self._ops >= self.max_pending
+        if full:
+            self.flush()
+
+    def _daily_deltas(self, child: str, days):
+        # days None = semua hari
+        wanted = set(days) if days is not None else None
+        out = {}
+        for (_, c, day), d in self._pending.items():
+            if c != child or (wanted is not None and day not in wanted):
+                continue
+            acc = out.setdefault(day, [0, 0, 0, 0])
+            for i in range(4):
+                acc[i] += d[i]
+        return out
+
+    def read_consistent(self, read_fn, child: str, days):
+        # Baca SQL + delta yang belum di-flush tanpa dobel hitung / kelewatan
+        # saat flush commit di tengah-tengah (seqlock sederhana).
+        for _ in range(5):
+            with self._lock:
+                g1 = self._generation
+            if g1 % 2 == 0:
+                rows = read_fn()
+                with self._lock:
+                    if self._generation == g1:
+                        return rows, self._daily_deltas(child, days)
+            time.sleep(0.001)
+
+        with self._flush_lock:
+            rows = read_fn()
+            with self._lock:
+                return rows, self._daily_deltas(child, days)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._ops = 0
+                if not batch:
+                    return 0
+                self._generation += 1
+
+            try:
+                self.repo.apply_counter_deltas(
+                    [(sid, child, day, d[SERVED], d[ANSWERED], d[CORRECT], d[EARNED]) for (sid, child, day), d in batch.items()]
+                )
+            except Exception:
+                # balikin ke pending supaya tidak hilang, dicoba lagi di flush berikutnya
+                with self._lock:
+                    for key, d in batch.items():
+                        acc = self._pending.setdefault(key, [0, 0, 0, 0])
+                        for i in range(4):
+                            acc[i] += d[i]
+                    self._generation += 1
+                raise
+
+            with self._lock:
+                self._generation += 1
+            return len(batch)
+
+    def discard(self):
+        with self._flush_lock:
+            with self._lock:
+                self._pending = {}
+                self._ops = 0
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                log.exception("counter flush gagal")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="counter-flush", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
@@ -0,0 +1,70 @@
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class AnswerEventLog:
+    # Appender untuk tabel answer_events. /api/answer cuma menaruh baris di list;
+    # thread flush meng-insert batch dalam satu transaksi (executemany).
+    def __init__(self, repo, flush_interval: float, max_pending: int):
+        self.repo = repo
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def append(self, child: str, day: str, qid: str, answer, correct: bool, latency_ms, answered_at: str):
+        with self._lock:
+            self._pending.append((child, day, qid, answer, int(correct), latency_ms, answered_at))
+            full = len(self._pending) >= self.max_pending
+        if full:
+            # flush di thread appender, bukan di request
+            self._wake.set()
+        if self._thread is None:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self.repo.insert_answer_events(batch)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = batch
+                raise
+            return len(batch)
+
+    def discard(self):
+        with self._flush_lock:
+            with self._lock:
+                self._pending = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("flush answer_events gagal")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="answer-events", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+from datetime import date
+from typing import Optional
+
+from app.config import EXPORT_BATCH
+from app.db.storage import Storage
+
+# kind -> (kolom, nama method Storage)
+EXPORTS = {
+    "daily": (("child", "day", "served_count", "answered_count", "correct_count", "earned"), "iter_daily"),
+    "events": (("id", "child", "day", "qid", "answer", "correct", "latency_ms", "answered_at"), "iter_answer_events"),
+}
+FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+class ExportService:
+    # /api/export: baris child_daily / answer_events sebagai CSV atau NDJSON. open() mengembalikan
+    # generator potongan bytes (satu batch Storage per potongan); route memanggil next() di DbExecutor.
+    def __init__(self, repo: Storage, batch: int = EXPORT_BATCH):
+        self.repo = repo
+        self.batch = batch
+
+    @staticmethod
+    def parse_day(value: Optional[str]) -> Optional[str]:
+        # ValueError kalau bukan YYYY-MM-DD
+        return date.fromisoformat(value).isoformat() if value else None
+
+    def open(self, kind: str, fmt: str, children, start_day: Optional[str] = None, end_day: Optional[str] = None):
+        columns, method = EXPORTS[kind]
+        batches = getattr(self.repo, method)(children, start_day, end_day, self.batch)
+        if fmt == "csv":
+            return self._csv(columns, batches)
+        return self._ndjson(columns, batches)
+
+    @staticmethod
+    def _csv(columns, batches):
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        writer.writerow(columns)
+        try:
+            for rows in batches:
+                writer.writerows([r[c] for c in columns] for r in rows)
+                yield buf.getvalue().encode()
+                buf.seek(0)
+                buf.truncate()
+            if buf.tell():
+                # header saja (tidak ada baris)
+                yield buf.getvalue().encode()
+        finally:
+            batches.close()
+
+    @staticmethod
+    def _ndjson(columns, batches):
+        try:
+            for rows in batches:
+                yield "".join(
+                    json.dumps({c: r[c] for c in columns}, separators=(",", ":")) + "\n" for r in rows
+                ).encode()
+        finally:
+            batches.close()
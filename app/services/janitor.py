@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+
+def release_free_pages(repo, pages: int, stop: threading.Event, pause: float = 0.05) -> int:
+    # incremental_vacuum bertahap sampai freelist kosong; dipakai janitor dan job clear admin
+    if repo.auto_vacuum_mode() != 2:
+        return 0
+    freed = 0
+    while not stop.is_set():
+        before = repo.freelist_count()
+        if not before:
+            break
+        repo.incremental_vacuum(pages)
+        after = repo.freelist_count()
+        freed += before - after
+        if after >= before:
+            break
+        stop.wait(pause)
+    return freed
+
+
+class SessionJanitor:
+    # Maintenance berkala di background (lifespan): hapus sesi yang sudah lama tidak aktif dan
+    # token jawaban yang sudah kedaluwarsa dalam batch kecil, kembalikan halaman kosong ke OS
+    # lewat incremental_vacuum, lalu PRAGMA optimize. Tiap langkah transaksi pendek sendiri.
+    def __init__(
+        self,
+        repo,
+        interval: float,
+        session_ttl_days: int,
+        token_ttl_s: int,
+        batch_size: int,
+        vacuum_pages: int,
+        pause: float = 0.05,
+    ):
+        self.repo = repo
+        self.interval = interval
+        self.session_ttl_days = session_ttl_days
+        self.token_ttl_s = token_ttl_s
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.pause = pause
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _drain(self, delete_fn, cutoff) -> int:
+        total = 0
+        while not self._stop.is_set():
+            n = delete_fn(cutoff, self.batch_size)
+            total += n
+            if n < self.batch_size:
+                break
+            # jeda antar batch: writer / request lain sempat ambil lock
+            self._stop.wait(self.pause)
+        return total
+
+    def run_once(self) -> dict:
+        t0 = time.perf_counter()
+        session_cutoff = (date.today() - timedelta(days=self.session_ttl_days)).isoformat()
+        token_cutoff = (datetime.now() - timedelta(seconds=self.token_ttl_s)).isoformat(timespec="seconds")
+        report = {
+            "sessions": self._drain(self.repo.delete_expired_sessions, session_cutoff),
+            "tokens": self._drain(self.repo.delete_expired_tokens, token_cutoff),
+            "pages": release_free_pages(self.repo, self.vacuum_pages, self._stop, self.pause),
+        }
+        self.repo.optimize()
+        report["seconds"] = round(time.perf_counter() - t0, 3)
+        self.last_report = report
+        log.info(
+            "janitor: %(sessions)d sesi, %(tokens)d token dihapus, %(pages)d halaman dikembalikan (%(seconds)ss)",
+            report,
+        )
+        return report
+
+    def _run(self):
+        if self.repo.auto_vacuum_mode() != 2:
+            log.warning("auto_vacuum bukan INCREMENTAL; file tidak mengecil sebelum dikonversi sekali lewat POST /api/admin/vacuum")
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("janitor gagal")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="janitor", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,155 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+# Leitner box -> jarak ke review berikutnya (detik). Salah = balik ke box 0.
+INTERVALS_S = (60, 10 * 60, 24 * 3600, 3 * 24 * 3600, 7 * 24 * 3600, 21 * 24 * 3600)
+# soal yang sudah dikirim tapi belum dijawab muncul lagi setelah ini
+PENDING_S = 10 * 60
+
+BOX, DUE, SEEN, CORRECT = range(4)
+
+
+class _ChildState:
+    __slots__ = ("items", "heap", "parked", "bank")
+
+    def __init__(self, items: dict):
+        # items: qid -> [box, due_at, seen, correct]; heap: (due_at, qid), entry basi dibuang saat pop.
+        # parked: qid yang tidak ada di bank terakhir (versi `bank`), di luar heap sampai bank anak berganti
+        self.items = items
+        self.heap = [(st[DUE], qid) for qid, st in items.items()]
+        heapq.heapify(self.heap)
+        self.parked = set()
+        self.bank = None
+
+    def use_bank(self, version):
+        # bank ganti: item yang diparkir dicoba lagi di bank baru
+        if version != self.bank:
+            self.bank = version
+            for qid in self.parked:
+                heapq.heappush(self.heap, (self.items[qid][DUE], qid))
+            self.parked = set()
+
+    def push(self, qid: str, due: float):
+        self.items[qid][DUE] = due
+        self.parked.discard(qid)
+        heapq.heappush(self.heap, (due, qid))
+        if len(self.heap) > 2 * len(self.items) + 64:
+            self.heap = [(st[DUE], q) for q, st in self.items.items() if q not in self.parked]
+            heapq.heapify(self.heap)
+
+
+class MasteryScheduler:
+    # Spaced repetition per (child, qid). State per anak dimuat sekali dari item_mastery
+    # saat pertama dipakai; jawaban di-upsert balik secara batch oleh thread flush.
+    def __init__(self, repo, flush_interval: float):
+        self.repo = repo
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._children = {}
+        self._dirty = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _state(self, child: str) -> _ChildState:
+        st = self._children.get(child)
+        if st is None:
+            items = {qid: [box, due, seen, correct] for qid, box, due, seen, correct in self.repo.select_mastery(child)}
+            st = self._children.setdefault(child, _ChildState(items))
+        return st
+
+    def pop_due(self, child: str, bank, now: float = None):
+        # item bank yang jatuh tempo paling awal, atau None kalau belum ada yang due.
+        # Item yang diambil ditandai pending supaya tidak terkirim dua kali dalam satu batch.
+        # Item dari bank lain (mis. sebelum bank_version anak diganti) diparkir sekali, bukan
+        # dipindai ulang di setiap panggilan; kembali ke heap kalau bank anak berganti lagi.
+        now = time.time() if now is None else now
+        with self._lock:
+            st = self._state(child)
+            st.use_bank(bank.version)
+            heap = st.heap
+            while heap and heap[0][0] <= now:
+                due, qid = heapq.heappop(heap)
+                item = st.items.get(qid)
+                if item is None or item[DUE] != due:
+                    continue
+                q = bank.find(qid)
+                if q is None:
+                    st.parked.add(qid)
+                    continue
+                st.push(qid, now + PENDING_S)
+                return q
+        return None
+
+    def is_known(self, child: str, qid: str) -> bool:
+        with self._lock:
+            return qid in self._state(child).items
+
+    def mark_served(self, child: str, qid: str, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            st = self._state(child)
+            if qid not in st.items:
+                st.items[qid] = [0, 0.0, 0, 0]
+                st.push(qid, now + PENDING_S)
+
+    def record(self, child: str, qid: str, correct: bool, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            st = self._state(child)
+            item = st.items.get(qid)
+            if item is None:
+                item = st.items[qid] = [0, 0.0, 0, 0]
+            item[BOX] = min(item[BOX] + 1, len(INTERVALS_S) - 1) if correct else 0
+            item[SEEN] += 1
+            item[CORRECT] += int(correct)
+            st.push(qid, now + INTERVALS_S[item[BOX]])
+            self._dirty.add((child, qid))
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                rows = []
+                for child, qid in dirty:
+                    item = self._children[child].items[qid]
+                    rows.append((child, qid, item[BOX], item[DUE], item[SEEN], item[CORRECT]))
+            if not rows:
+                return 0
+            try:
+                self.repo.upsert_mastery(rows, datetime.now().isoformat(timespec="seconds"))
+            except Exception:
+                with self._lock:
+                    self._dirty |= dirty
+                raise
+            return len(rows)
+
+    def reset(self):
+        with self._flush_lock:
+            with self._lock:
+                self._children = {}
+                self._dirty = set()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                log.exception("flush item_mastery gagal")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mastery-flush", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
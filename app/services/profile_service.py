@@ -0,0 +1,109 @@
+import threading
+import time
+from datetime import datetime
+
+from app.config import CHILD_BANKS, CHILDREN, PROFILE_CACHE_TTL_S, PROFILE_DEFAULT_GROUP
+from app.db.repo import EPOCH_SCOPE, PROFILES_SCOPE
+from app.db.storage import Storage
+
+
+class ProfileService:
+    # Profil anak (nama, grup/keluarga, versi bank) dari tabel profiles. Lookup per nama, anggota dan
+    # daftar tampilan per grup di-cache di memori. Cache dibuang kalau versi profil di database
+    # (bersama semua worker) berubah; versi itu dicek paling lama setiap PROFILE_CACHE_TTL_S.
+    def __init__(self, repo: Storage, ttl_s: float = PROFILE_CACHE_TTL_S):
+        self.repo = repo
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._by_name = {}
+        self._groups = {}
+        self._listings = {}
+        self._version = None
+        self._checked = 0.0
+
+    def seed_defaults(self):
+        # CHILDREN / CHILD_BANKS cuma mengisi profil yang belum ada; ubah lewat /api/admin/profiles
+        now = datetime.now().isoformat(timespec="seconds")
+        self.repo.insert_profiles(
+            [(name, name.capitalize(), PROFILE_DEFAULT_GROUP, CHILD_BANKS.get(name, 1), now) for name in CHILDREN]
+        )
+
+    def sync(self, force: bool = False) -> tuple:
+        # versi profil yang sesuai dengan isi cache; cache dikosongkan kalau worker lain mengubah profil
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._version is not None and now - self._checked < self.ttl_s:
+                return self._version
+        version = tuple(self.repo.get_versions([EPOCH_SCOPE, PROFILES_SCOPE]))
+        with self._lock:
+            if version != self._version:
+                self._by_name = {}
+                self._groups = {}
+                self._listings = {}
+                self._version = version
+            self._checked = now
+            return version
+
+    def data_version(self) -> tuple:
+        # ikut key ETag halaman yang menampilkan daftar anak
+        return self.sync()
+
+    def get(self, name: str):
+        if not name:
+            return None
+        self.sync()
+        with self._lock:
+            if name in self._by_name:
+                return self._by_name[name]
+        profile = self.repo.get_profile(name)
+        if profile:
+            # nama yang tidak dikenal tidak di-cache supaya URL acak tidak mengisi memori
+            with self._lock:
+                self._by_name[name] = profile
+        return profile
+
+    def members(self, group: str) -> list:
+        self.sync()
+        with self._lock:
+            names = self._groups.get(group)
+        if names is None:
+            names = [p["name"] for p in self.repo.select_profiles_by_group(group)]
+            if names:
+                with self._lock:
+                    self._groups[group] = names
+        return names
+
+    def group_of(self, child: str) -> str:
+        profile = self.get(child)
+        return profile["group_name"] if profile else PROFILE_DEFAULT_GROUP
+
+    def scope(self, group, child=None):
+        # grup sesi + anggotanya; stats cuma dihitung untuk anak di grup ini.
+        # Sesi lama tanpa grup memakai grup anaknya (atau PROFILE_DEFAULT_GROUP)
+        group = group or self.group_of(child)
+        return group, self.members(group)
+
+    def listing(self, group: str) -> list:
+        # untuk halaman: [{"name", "display_name"}] anggota grup
+        self.sync()
+        with self._lock:
+            out = self._listings.get(group)
+        if out is None:
+            out = [
+                {"name": p["name"], "display_name": p["display_name"]}
+                for p in self.repo.select_profiles_by_group(group)
+            ]
+            if out:
+                with self._lock:
+                    self._listings[group] = out
+        return out
+
+    def upsert(self, name: str, display_name: str, group: str, bank_version: int):
+        self.repo.upsert_profile(name, display_name, group, bank_version, datetime.now().isoformat(timespec="seconds"))
+        # worker ini langsung melihat perubahannya sendiri, worker lain setelah TTL
+        self.sync(force=True)
+        return self.get(name)
+
+    def reset(self):
+        # setelah restore database: profil dibaca ulang dari tabel
+        self.sync(force=True)
@@ -1,69 +1,136 @@
 import random
-from datetime import date
-from app.config import DAILY_LIMIT, REWARD_PER_CORRECT
+import secrets
+import time
+from typing import Optional
+from datetime import date, datetime
+from app.config import DAILY_LIMIT, REWARD_PER_CORRECT, CHILD_BANKS, QUESTION_BATCH_MAX, QUESTION_TOKEN_TTL_S
+from app.domain.question_bank import QuestionBank, EASY, MEDIUM, HARD
+from app.security import dumps, loads
+from app.services.mastery import MasteryScheduler
+from app.services.profile_service import ProfileService
 from app.services.stats_service import StatsService
 
+# berapa kali pick_adaptive diulang untuk mencari soal yang belum pernah dilihat
+_NEW_ITEM_TRIES = 8
+LIMIT_MESSAGE = f"Batas hari ini sudah tercapai ({DAILY_LIMIT} soal). Besok lanjut ya."
+
 class QuestionService:
-    def __init__(self, stats: StatsService, bank_v1: list[dict], bank_v2: list[dict], q_by_id: dict):
+    def __init__(
+        self,
+        stats: StatsService,
+        bank_v1: QuestionBank,
+        bank_v2: QuestionBank,
+        extra_banks=(),
+        scheduler: Optional[MasteryScheduler] = None,
+        profiles: Optional[ProfileService] = None,
+    ):
         self.stats = stats
+        self.scheduler = scheduler
+        self.profiles = profiles
         self.bank_v1 = bank_v1
         self.bank_v2 = bank_v2
-        self.q_by_id = q_by_id
+        self.banks = {b.version: b for b in (bank_v1, bank_v2, *extra_banks)}
+        self.rng = random.Random()
+
+    def apply_calibration(self, rows) -> int:
+        # rows: (qid, tier) dari item_calibration; tier hasil kalibrasi menggantikan tier dari
+        # difficulty_from_answer. Bank prosedural tidak punya daftar soal, jadi dilewati.
+        overrides = {}
+        for qid, tier in rows:
+            for ver, bank in self.banks.items():
+                if not hasattr(bank, "with_tiers"):
+                    continue
+                i = bank.find(qid)
+                if i is not None:
+                    overrides.setdefault(ver, {})[i] = tier
+                    break
+        for ver, changes in overrides.items():
+            self.banks[ver] = self.banks[ver].with_tiers(changes)
+        self.bank_v1 = self.banks.get(self.bank_v1.version, self.bank_v1)
+        self.bank_v2 = self.banks.get(self.bank_v2.version, self.bank_v2)
+        return sum(len(c) for c in overrides.values())
 
     @staticmethod
     def today_str():
         return date.today().isoformat()
 
-    @staticmethod
-    def split_bank_by_difficulty(bank):
-        easy = [q for q in bank if q.get("difficulty") == "easy"]
-        med = [q for q in bank if q.get("difficulty") == "medium"]
-        hard = [q for q in bank if q.get("difficulty") == "hard"]
-        return easy, med, hard
+    def adaptive_state(self, child: str):
+        days = self.stats.last_n_days(7)
+        recap = self.stats.get_daily_recap(child, days)
 
-    def pick_adaptive(self, child: str, bank: list[dict]):
-        easy, med, hard = self.split_bank_by_difficulty(bank)
+        served7 = int(recap["totals"].get("served_count", 0) or 0)
+        acc = int(recap["totals"].get("accuracy_pct", 0) or 0)
+        return served7, acc
 
+    def pick_adaptive(self, child: str, bank: QuestionBank, state=None):
         if not bank:
             raise ValueError("Bank soal kosong")
 
-        days = self.stats.last_n_days(7)
-        recap = self.stats.get_daily_recap(child, days)
+        served7, acc = state or self.adaptive_state(child)
 
-        served7 = int(recap["totals"].get("served_count", 0) or 0)
-        acc = int(recap["totals"].get("accuracy_pct", 0) or 0)
+        rng = self.rng
 
         # gating: sebelum 50 soal, pemula
         if served7 < 50:
-            return random.choice(easy or med or bank)
+            return bank.pick(rng, EASY, MEDIUM)
 
-        r = random.random()
+        r = rng.random()
 
         if acc < 60:
-            return random.choice(easy or bank)
+            return bank.pick(rng, EASY)
 
         if acc < 80:
             if r < 0.7:
-                return random.choice(easy or bank)
-            return random.choice(med or easy or bank)
+                return bank.pick(rng, EASY)
+            return bank.pick(rng, MEDIUM, EASY)
+
+        if r < 0.1 and bank.has_tier(HARD):
+            return bank.pick(rng, HARD)
+        if r < 0.6 and bank.has_tier(MEDIUM):
+            return bank.pick(rng, MEDIUM)
+        return bank.pick(rng, EASY, MEDIUM)
+
+    def pick_next(self, child: str, bank: QuestionBank, state=None):
+        # review yang jatuh tempo dulu (heap per anak), kalau tidak ada: soal baru dari tier adaptif
+        sched = self.scheduler
+        if sched is None:
+            return self.pick_adaptive(child, bank, state)
+
+        q = sched.pop_due(child, bank)
+        if q is not None:
+            return q
+
+        state = state or self.adaptive_state(child)
+        for _ in range(_NEW_ITEM_TRIES):
+            q = self.pick_adaptive(child, bank, state)
+            if not sched.is_known(child, bank.qid(q)):
+                break
+        sched.mark_served(child, bank.qid(q))
+        return q
 
-        if r < 0.1 and hard:
-            return random.choice(hard)
-        if r < 0.6 and med:
-            return random.choice(med)
-        return random.choice(easy or med or bank)
+    def record_results(self, child: str, results):
+        # results: [(qid, correct)] untuk jawaban yang benar-benar dihitung
+        if self.scheduler:
+            for qid, correct in results:
+                self.scheduler.record(child, qid, correct)
 
     def resolve_bank_for_child(self, child: str):
-        if child == "alleia":
-            return self.bank_v1, 1
-        if child == "althafandra":
-            return self.bank_v2, 2
-        return None, None
+        if self.profiles is not None:
+            profile = self.profiles.get(child)
+            qver = profile["bank_version"] if profile else None
+        else:
+            qver = CHILD_BANKS.get(child)
+        bank = self.banks.get(qver)
+        if not bank:
+            return None, None
+        return bank, qver
+
+    def answered_on(self, child: str, day: str) -> int:
+        recap = self.stats.get_daily_recap(child, [day])
+        return int(recap["days"][0].get("answered_count", 0) or 0)
 
     def check_daily_limit(self, child: str):
-        today = self.today_str()
-        recap = self.stats.get_daily_recap(child, [today])
-        answered_today = int(recap["days"][0].get("answered_count", 0) or 0)
+        answered_today = self.answered_on(child, self.today_str())
         return answered_today < DAILY_LIMIT, answered_today
 
     def get_question_payload(self, session_id: str, child: str):
@@ -73,16 +140,73 @@ class QuestionService:
 
         ok, answered_today = self.check_daily_limit(child)
         if not ok:
-            return {"ok": False, "message": f"Batas hari ini sudah tercapai ({DAILY_LIMIT} soal). Besok lanjut ya."}, 200
+            return {"ok": False, "message": LIMIT_MESSAGE}, 200
 
-        q = self.pick_adaptive(child, bank)
-        qid = q["id"]
-        q_full = self.q_by_id.get(qid, q)
+        q = self.pick_next(child, bank)
+        return {"ok": True, "qid": bank.qid(q), "prompt": bank.prompt(q), "version": qver}, 200
 
-        return {"ok": True, "qid": qid, "prompt": q_full["prompt"], "version": qver}, 200
+    # Token soal: {child, qid, issued_at, nonce} bertanda tangan. Dipakai /api/questions
+    # supaya jawaban tidak bergantung ke satu slot current_qid di tabel sessions.
+    @staticmethod
+    def issue_token(child: str, qid: str) -> str:
+        return dumps([child, qid, int(time.time()), secrets.token_urlsafe(9)])
+
+    @staticmethod
+    def read_token(token: str):
+        try:
+            child, qid, issued_at, nonce = loads(token)
+        except (ValueError, TypeError):
+            return None
+        if issued_at + QUESTION_TOKEN_TTL_S < time.time():
+            return None
+        return {"child": child, "qid": qid, "issued_at": issued_at, "nonce": nonce}
+
+    @staticmethod
+    def latency_ms(client_ms, issued_at=None, answered_ts=None):
+        # latency dari device (waktu soal tampil -> submit) kalau masuk akal,
+        # selain itu selisih kasar dari issued_at token (resolusi detik)
+        try:
+            ms = int(client_ms)
+        except (TypeError, ValueError):
+            ms = -1
+        if 0 <= ms <= QUESTION_TOKEN_TTL_S * 1000:
+            return ms
+        if issued_at is None:
+            return None
+        return int(((answered_ts or time.time()) - issued_at) * 1000)
+
+    def get_question_batch(self, child: str, n: int, held: int = 0):
+        # held: soal yang masih antri di device; n dipotong ke sisa jatah hari ini
+        bank, qver = self.resolve_bank_for_child(child)
+        if not bank:
+            return {"ok": False, "message": "Akun tidak dikenal."}, 400
+
+        ok, answered_today = self.check_daily_limit(child)
+        if not ok:
+            return {"ok": False, "message": LIMIT_MESSAGE}, 200
+
+        n = min(n, QUESTION_BATCH_MAX, DAILY_LIMIT - answered_today - max(held, 0))
+        if n <= 0:
+            return {"ok": True, "version": qver, "questions": []}, 200
+        state = self.adaptive_state(child)
+        questions = []
+        for _ in range(n):
+            q = self.pick_next(child, bank, state)
+            qid = bank.qid(q)
+            questions.append({"qid": qid, "prompt": bank.prompt(q), "token": self.issue_token(child, qid)})
+
+        return {"ok": True, "version": qver, "questions": questions}, 200
+
+    def find_question(self, qid: str):
+        # bank statis (index) atau ProceduralBank (operand hasil decode qid)
+        for bank in self.banks.values():
+            q = bank.find(qid)
+            if q is not None:
+                return bank.get(q)
+        return None
 
     def evaluate_answer(self, qid: str, ans_str: str):
-        q = self.q_by_id.get(qid)
+        q = self.find_question(qid)
         if not q:
             return None, None, False
 
@@ -93,4 +217,47 @@ class QuestionService:
 
         correct_val = int(q["answer"])
         correct = user_val is not None and user_val == correct_val
-        return q, correct_val, correct
\ No newline at end of file
+        return q, correct_val, correct
+
+    def grade_token_answers(self, records):
+        # records: [{"token", "answer", "ts"}] dari /api/answers (ts = epoch ms di device).
+        # Anak diambil dari token (bertanda tangan), bukan dari sesi: antrian offline tetap sah
+        # setelah logout / ganti akun di device. Waktu jawab dijepit antara saat token dibuat dan
+        # sekarang, lalu dipakai untuk hari di child_daily. "final": True = tidak akan pernah
+        # diterima (token rusak / kedaluwarsa, atau di atas DAILY_LIMIT hari itu).
+        now = time.time()
+        results, answers, index = [], [], []
+        remaining = {}
+        for rec in records:
+            tok = self.read_token(rec.get("token") or "") if isinstance(rec, dict) else None
+            if not tok:
+                results.append({"ok": False, "final": True, "message": "Token soal tidak valid."})
+                continue
+            child = tok["child"]
+
+            ans = str(rec.get("answer") or "").strip()
+            q, correct_val, correct = self.evaluate_answer(tok["qid"], ans)
+            if not q:
+                results.append({"ok": False, "message": "Soal tidak ditemukan."})
+                continue
+
+            try:
+                ts = float(rec.get("ts")) / 1000
+            except (TypeError, ValueError):
+                ts = now
+            ts = min(max(ts, tok["issued_at"]), now)
+            at = datetime.fromtimestamp(ts)
+            day = at.date().isoformat()
+            if (child, day) not in remaining:
+                remaining[child, day] = DAILY_LIMIT - self.answered_on(child, day)
+            if remaining[child, day] <= 0:
+                results.append({"ok": False, "final": True, "limit": True, "message": LIMIT_MESSAGE})
+                continue
+            remaining[child, day] -= 1
+            latency = self.latency_ms(rec.get("latency_ms"), tok["issued_at"], ts)
+            index.append(len(results))
+            answers.append(
+                (tok["nonce"], child, day, tok["qid"], ans, correct, at.isoformat(timespec="seconds"), latency)
+            )
+            results.append({"ok": True, "correct": correct, "correct_answer": correct_val})
+        return results, answers, index
@@ -0,0 +1,70 @@
+import threading
+from datetime import date, timedelta
+
+
+class RecapCache:
+    # Counter child_daily untuk N hari terakhir, di-update langsung oleh StatsService.
+    # Cuma valid kalau semua tulisan lewat proses ini (satu worker).
+    def __init__(self, window_days: int):
+        self.window_days = window_days
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._today = None
+        self._start = None
+
+    def _roll(self):
+        today = date.today().isoformat()
+        if today == self._today:
+            return
+        self._today = today
+        self._start = (date.today() - timedelta(days=self.window_days - 1)).isoformat()
+        self._rows = {k: v for k, v in self._rows.items() if k[1] >= self._start}
+
+    def start_day(self):
+        with self._lock:
+            self._roll()
+            return self._start
+
+    def load(self, rows):
+        with self._lock:
+            self._roll()
+            self._rows = {}
+            for r in rows:
+                if r["day"] < self._start:
+                    continue
+                self._rows[(r["child"], r["day"])] = [
+                    int(r["served_count"] or 0),
+                    int(r["answered_count"] or 0),
+                    int(r["correct_count"] or 0),
+                    int(r["earned"] or 0),
+                ]
+
+    def clear(self):
+        with self._lock:
+            self._rows = {}
+
+    def get(self, child: str, days: list[str]):
+        # None kalau ada hari di luar window -> caller fallback ke SQL
+        with self._lock:
+            self._roll()
+            if days[0] < self._start or days[-1] > self._today:
+                return None
+            out = {}
+            for d in days:
+                v = self._rows.get((child, d))
+                if v:
+                    out[d] = {"day": d, "served_count": v[0], "answered_count": v[1], "correct_count": v[2], "earned": v[3]}
+            return out
+
+    def add(self, child: str, day: str, served=0, answered=0, correct=0, earned=0):
+        with self._lock:
+            self._roll()
+            if day < self._start:
+                return
+            v = self._rows.get((child, day))
+            if v is None:
+                v = self._rows[(child, day)] = [0, 0, 0, 0]
+            v[0] += served
+            v[1] += answered
+            v[2] += correct
+            v[3] += earned
@@ -1,12 +1,73 @@
 import secrets
+import time
 from datetime import date, datetime
 from fastapi import Request, Response
-from app.config import COOKIE_NAME
-from app.db.repo import Repo
+from app.config import COOKIE_NAME, SESSION_MODE, SESSION_COOKIE_TTL_S
+from app.db.storage import Storage
+from app.security import dumps, loads
+
+
+class SessionContext:
+    # Row sessions yang dibaca sekali per request; tulisan lewat SessionService ikut meng-update object ini.
+    __slots__ = (
+        "session_id",
+        "child",
+        "group",
+        "day",
+        "served_count",
+        "answered_count",
+        "correct_count",
+        "earned",
+        "current_qid",
+        "question_nonce",
+        "is_new",
+        "stateless",
+        "dirty",
+    )
+
+    def __init__(self, row: dict, is_new: bool = False, stateless: bool = False):
+        self.session_id = row["session_id"]
+        self.child = row.get("child")
+        # grup yang dipilih di /home; None = sesi lama, grup diambil dari anaknya
+        self.group = row.get("group_name")
+        self.day = row.get("day")
+        self.served_count = int(row.get("served_count") or 0)
+        self.answered_count = int(row.get("answered_count") or 0)
+        self.correct_count = int(row.get("correct_count") or 0)
+        self.earned = int(row.get("earned") or 0)
+        self.current_qid = row.get("current_qid")
+        # sesi stateless: nonce per soal, diklaim di answered_tokens saat dijawab supaya cookie lama
+        # yang di-replay tidak bisa menilai soal yang sama dua kali
+        self.question_nonce = row.get("question_nonce")
+        self.is_new = is_new
+        self.stateless = stateless
+        self.dirty = False
+
+    @property
+    def counter_session_id(self):
+        # id untuk counter di tabel sessions; None = cuma child_daily yang di-update
+        return None if self.stateless else self.session_id
+
+    def stage_current_qid(self, qid):
+        # cuma object ini (+ cookie stateless); tabel sessions ditulis StatsService di transaksi
+        # counter yang sama, atau lewat SessionService.set_current_qid
+        self.current_qid = qid
+        self.question_nonce = secrets.token_urlsafe(9) if qid and self.stateless else None
+        self.dirty = True
+
+    def reset_daily(self, day: str):
+        self.day = day
+        self.served_count = self.answered_count = self.correct_count = self.earned = 0
+        self.current_qid = self.question_nonce = None
+        self.dirty = True
+
 
 class SessionService:
-    def __init__(self, repo: Repo):
+    # SESSION_MODE="cookie": state sesi (id, child, day, current_qid) ada di cookie
+    # bertanda tangan + expiry, tanpa baris di tabel sessions.
+    def __init__(self, repo: Storage, stateless: bool = SESSION_MODE == "cookie"):
         self.repo = repo
+        self.stateless = stateless
 
     @staticmethod
     def today_str():
@@ -20,38 +81,90 @@ class SessionService:
     def new_session_id():
         return secrets.token_urlsafe(24)
 
-    def get_or_create(self, request: Request, response: Response) -> str:
-        sess = request.cookies.get(COOKIE_NAME)
+    @staticmethod
+    def encode_cookie(ctx: SessionContext) -> str:
+        exp = int(time.time()) + SESSION_COOKIE_TTL_S
+        return dumps([ctx.session_id, ctx.child, ctx.group, ctx.day, ctx.current_qid, ctx.question_nonce, exp])
 
-        if not sess:
-            sess = self.new_session_id()
-            self.repo.insert_session(sess, self.today_str(), self.now_str())
-            response.set_cookie(COOKIE_NAME, sess, httponly=True, samesite="lax")
-            return sess
+    @staticmethod
+    def decode_cookie(value: str):
+        fields = loads(value)
+        if isinstance(fields, list) and len(fields) == 6:
+            # cookie dari sebelum ada grup di sesi
+            fields.insert(2, None)
+        try:
+            sid, child, group, day, qid, nonce, exp = fields
+        except (ValueError, TypeError):
+            return None
+        if exp < time.time():
+            return None
+        return {
+            "session_id": sid, "child": child, "group_name": group, "day": day, "current_qid": qid, "question_nonce": nonce,
+        }
 
-        row = self.repo.get_session(sess)
+    def _load_stateless(self, request: Request) -> SessionContext:
+        today = self.today_str()
+        row = self.decode_cookie(request.cookies.get(COOKIE_NAME) or "")
         if not row:
-            self.repo.insert_session(sess, self.today_str(), self.now_str())
-            response.set_cookie(COOKIE_NAME, sess, httponly=True, samesite="lax")
-            return sess
+            return SessionContext({"session_id": self.new_session_id(), "day": today}, is_new=True, stateless=True)
+
+        ctx = SessionContext(row, stateless=True)
+        if ctx.day != today:
+            ctx.reset_daily(today)
+        return ctx
+
+    def load(self, request: Request) -> SessionContext:
+        if self.stateless:
+            return self._load_stateless(request)
 
-        if row["day"] != self.today_str():
-            self.repo.update_session_reset_daily(sess, self.today_str())
+        sess = request.cookies.get(COOKIE_NAME)
+        today = self.today_str()
+
+        row = self.repo.get_session(sess) if sess else None
+        if not row:
+            sess = sess or self.new_session_id()
+            self.repo.insert_session(sess, today, self.now_str())
+            return SessionContext({"session_id": sess, "day": today}, is_new=True)
 
-        return sess
+        ctx = SessionContext(row)
+        if ctx.day != today:
+            self.repo.update_session_reset_daily(sess, today)
+            ctx.reset_daily(today)
+        return ctx
 
-    def require_child(self, session_id: str):
-        row = self.repo.get_session(session_id)
-        return row and row.get("child")
+    def apply_cookie(self, ctx: SessionContext, response: Response):
+        if ctx.stateless:
+            if ctx.is_new or ctx.dirty:
+                response.set_cookie(
+                    COOKIE_NAME, self.encode_cookie(ctx), max_age=SESSION_COOKIE_TTL_S, httponly=True, samesite="lax"
+                )
+        elif ctx.is_new:
+            response.set_cookie(COOKIE_NAME, ctx.session_id, httponly=True, samesite="lax")
 
-    def set_child(self, session_id: str, child: str):
-        self.repo.set_child(session_id, child)
+    def set_child(self, ctx: SessionContext, child: str, group: str):
+        if not ctx.stateless:
+            self.repo.set_child(ctx.session_id, child, group)
+        ctx.child = child
+        ctx.group = group
+        ctx.dirty = True
 
-    def get_stats(self, session_id: str):
-        return self.repo.get_session(session_id)
+    def set_group(self, ctx: SessionContext, group: str):
+        if not ctx.stateless:
+            self.repo.set_session_group(ctx.session_id, group)
+        ctx.group = group
+        ctx.child = None
+        ctx.current_qid = ctx.question_nonce = None
+        ctx.dirty = True
 
-    def set_current_qid(self, session_id: str, qid):
-        self.repo.set_current_qid(session_id, qid)
+    def set_current_qid(self, ctx: SessionContext, qid):
+        if not ctx.stateless:
+            self.repo.set_current_qid(ctx.session_id, qid)
+        ctx.stage_current_qid(qid)
 
-    def logout(self, session_id: str):
-        self.repo.logout_session(session_id)
\ No newline at end of file
+    def logout(self, ctx: SessionContext):
+        # grup sesi tetap, /home sesudahnya masih menampilkan grup yang sama
+        if not ctx.stateless:
+            self.repo.logout_session(ctx.session_id)
+        ctx.child = None
+        ctx.current_qid = ctx.question_nonce = None
+        ctx.dirty = True
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+
+class Subscriber:
+    __slots__ = ("queue", "overflow")
+
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize)
+        self.overflow = False
+
+
+class StatsBus:
+    # Pub/sub in-process untuk /api/stats/stream. publish() dipanggil dari thread DB / writer;
+    # satu call_soon_threadsafe per event loop, lalu fan-out ke queue tiap koneksi di loop itu.
+    # Koneksi yang idle cuma menunggu di queue.get(), tidak ada kerja selama data tidak berubah.
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._loops = {}
+
+    def subscribe(self) -> Subscriber:
+        loop = asyncio.get_running_loop()
+        sub = Subscriber(self.queue_size)
+        with self._lock:
+            self._loops.setdefault(loop, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            subs = self._loops.get(loop)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._loops[loop]
+
+    def publish(self, event: dict):
+        with self._lock:
+            loops = list(self._loops)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._deliver, loop, event)
+            except RuntimeError:
+                # loop sudah ditutup
+                with self._lock:
+                    self._loops.pop(loop, None)
+
+    def _deliver(self, loop, event: dict):
+        with self._lock:
+            subs = list(self._loops.get(loop, ()))
+        for sub in subs:
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # klien terlalu lambat: stream ditutup, EventSource reconnect dan ambil snapshot baru
+                sub.overflow = True
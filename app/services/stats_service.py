@@ -1,18 +1,98 @@
+import itertools
+import secrets
+import threading
+from contextlib import contextmanager
 from datetime import date, timedelta
-from app.db.repo import Repo
+from typing import Optional
+from app.db.repo import EPOCH_SCOPE
+from app.db.storage import Storage
+from app.services.counter_buffer import CounterBuffer, SERVED, ANSWERED, CORRECT, EARNED
+from app.services.event_log import AnswerEventLog
+from app.services.recap_cache import RecapCache
+from app.services.stats_bus import StatsBus
+
+_KEEP = object()
+
+# /api/stats?range=: jumlah hari, None = sejak awal
+RANGES = {"7d": 7, "30d": 30, "365d": 365, "all": None}
+
+
+def split_range(start: date, end: date):
+    # [start, end] dipecah jadi bulan penuh, minggu penuh (mulai Senin) dan sisa hari;
+    # paling banyak ~12 bulan + beberapa minggu/hari per tahun, tidak tergantung panjang histori
+    parts = []
+    d = start
+    while d <= end:
+        next_month = (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+        if d.day == 1 and next_month - timedelta(days=1) <= end:
+            parts.append(("month", d.strftime("%Y-%m")))
+            d = next_month
+        elif d.weekday() == 0 and d + timedelta(days=6) <= end:
+            parts.append(("week", d.isoformat()))
+            d += timedelta(days=7)
+        else:
+            parts.append(("day", d.isoformat()))
+            d += timedelta(days=1)
+    return parts
 
 class StatsService:
-    def __init__(self, repo: Repo):
+    def __init__(
+        self,
+        repo: Storage,
+        buffer: Optional[CounterBuffer] = None,
+        cache: Optional[RecapCache] = None,
+        events: Optional[AnswerEventLog] = None,
+        bus: Optional[StatsBus] = None,
+    ):
         self.repo = repo
+        self.buffer = buffer
+        self.cache = cache
+        self.events = events
+        self.bus = bus
+        # versi data per anak, naik di setiap tulis proses ini. ETag memakai versi bersama dari
+        # Storage (tabel data_versions); versi lokal cuma ikut untuk tulisan yang masih di buffer.
+        self._versions = {}
+        self._seq = itertools.count(1)
+        self._last_version = 0
+        self.epoch = secrets.token_hex(4)
+        # tulisan counter yang sedang jalan vs snapshot SSE (lihat snapshot())
+        self._write_cond = threading.Condition()
+        self._writes = 0
+        self._frozen = False
 
     @staticmethod
     def last_n_days(n: int):
         end = date.today()
         return [(end - timedelta(days=i)).isoformat() for i in range(n - 1, -1, -1)]
 
-    def get_daily_recap(self, child: str, days: list[str]):
-        rows = self.repo.select_daily_range(child, days[0], days[-1])
+    def warm_cache(self):
+        if self.cache:
+            self.cache.load(self.repo.select_daily_since(self.cache.start_day()))
+
+    def _load_days(self, child: str, days: list[str]):
+        if self.cache:
+            by_day = self.cache.get(child, days)
+            if by_day is not None:
+                return by_day
+
+        if self.buffer:
+            rows, deltas = self.buffer.read_consistent(
+                lambda: self.repo.select_daily_range(child, days[0], days[-1]), child, days
+            )
+        else:
+            rows, deltas = self.repo.select_daily_range(child, days[0], days[-1]), {}
         by_day = {r["day"]: r for r in rows}
+        for d, delta in deltas.items():
+            r = dict(by_day.get(d) or {"day": d, "served_count": 0, "answered_count": 0, "correct_count": 0, "earned": 0})
+            r["served_count"] = int(r.get("served_count", 0) or 0) + delta[SERVED]
+            r["answered_count"] = int(r.get("answered_count", 0) or 0) + delta[ANSWERED]
+            r["correct_count"] = int(r.get("correct_count", 0) or 0) + delta[CORRECT]
+            r["earned"] = int(r.get("earned", 0) or 0) + delta[EARNED]
+            by_day[d] = r
+        return by_day
+
+    def get_daily_recap(self, child: str, days: list[str]):
+        by_day = self._load_days(child, days)
 
         out = []
         for d in days:
@@ -52,20 +132,199 @@ class StatsService:
             },
         }
 
+    def get_recaps(self, children, days: list[str]):
+        return {c: self.get_daily_recap(c, days) for c in children}
+
+    def get_recap7(self, child: str, members, days: list[str]):
+        # (recap semua anggota, recap hari terakhir untuk child); dipakai /api/stats dan snapshot SSE
+        recap = self.get_recaps(members, days)
+        if child in recap:
+            return recap, {"days": recap[child]["days"][-1:]}
+        return recap, self.get_daily_recap(child, days[-1:])
+
+    def get_range_totals(self, child: str, start: Optional[date], end: date):
+        # dari child_rollup / child_daily lewat split_range; start None = all-time
+        parts = split_range(start, end) if start else [("all", "")]
+        if self.buffer:
+            days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)] if start else None
+            totals, deltas = self.buffer.read_consistent(
+                lambda: self.repo.select_range_totals(child, parts), child, days
+            )
+            for delta in deltas.values():
+                totals = [t + x for t, x in zip(totals, delta)]
+        else:
+            totals = self.repo.select_range_totals(child, parts)
+
+        served, answered, correct, earned = totals
+        return {
+            "child": child,
+            "totals": {
+                "served_count": served,
+                "answered_count": answered,
+                "correct_count": correct,
+                "earned": earned,
+                "accuracy_pct": round((correct / answered) * 100) if answered > 0 else 0,
+            },
+        }
+
+    def get_range_recaps(self, children, range_name: str):
+        n = RANGES[range_name]
+        end = date.today()
+        start = end - timedelta(days=n - 1) if n else None
+        return {
+            "range": {"name": range_name, "start": start.isoformat() if start else None, "end": end.isoformat()},
+            "children": {c: self.get_range_totals(c, start, end) for c in children},
+        }
+
     def upsert_daily(self, child: str, day: str):
         self.repo.upsert_daily(child, day)
 
-    def inc_served(self, session_id: str, child: str, day: str):
-        self.upsert_daily(child, day)
-        self.repo.inc_session_served(session_id)
-        self.repo.inc_daily_served(child, day)
+    def data_version(self, children) -> tuple:
+        # versi data anak-anak yang dirender; jawaban anak lain tidak mengubahnya
+        shared = tuple(self.repo.get_versions([EPOCH_SCOPE, *children]))
+        if not self.buffer:
+            return shared
+        # COUNTER_BUFFER: tulisan proses ini yang belum di-flush belum menaikkan versi di database
+        return (*shared, self.epoch, *(self._versions.get(c, 0) for c in children))
 
-    def inc_answered(self, session_id: str, child: str, day: str):
-        self.upsert_daily(child, day)
-        self.repo.inc_session_answered(session_id)
-        self.repo.inc_daily_answered(child, day)
+    @contextmanager
+    def _writing(self):
+        # tulis counter + _cached; ditahan sebentar selama snapshot() membaca
+        with self._write_cond:
+            self._write_cond.wait_for(lambda: not self._frozen)
+            self._writes += 1
+        try:
+            yield
+        finally:
+            with self._write_cond:
+                self._writes -= 1
+                self._write_cond.notify_all()
+
+    def snapshot(self, read_fn, *args):
+        # (read_fn(*args), versi): dibaca tanpa tulisan counter di tengahnya, jadi delta StatsBus dengan
+        # version <= versi ini sudah termasuk di hasil dan delta sesudahnya belum
+        with self._write_cond:
+            self._write_cond.wait_for(lambda: not self._frozen)
+            self._frozen = True
+            self._write_cond.wait_for(lambda: self._writes == 0)
+        try:
+            return read_fn(*args), self._last_version
+        finally:
+            with self._write_cond:
+                self._frozen = False
+                self._write_cond.notify_all()
+
+    def _cached(self, child: str, day: str, **deltas):
+        version = self._versions[child] = self._last_version = next(self._seq)
+        if self.cache:
+            self.cache.add(child, day, **deltas)
+        if self.bus:
+            self.bus.publish({
+                "type": "delta",
+                "child": child,
+                "day": day,
+                "version": version,
+                "served_count": deltas.get("served", 0),
+                "answered_count": deltas.get("answered", 0),
+                "correct_count": deltas.get("correct", 0),
+                "earned": deltas.get("earned", 0),
+            })
 
-    def mark_correct(self, session_id: str, child: str, day: str, reward: int):
+    def _apply(self, session_id, child: str, day: str, served=0, answered=0, correct=0, earned=0, qid=_KEEP):
+        # dijalankan lewat repo.atomic(): satu transaksi / satu perintah writer
         self.upsert_daily(child, day)
-        self.repo.inc_session_correct_earned(session_id, reward)
-        self.repo.inc_daily_correct_earned(child, day, reward)
\ No newline at end of file
+        if served:
+            self.repo.inc_daily_served(child, day, served)
+        if answered:
+            self.repo.inc_daily_answered(child, day)
+        if correct:
+            self.repo.inc_daily_correct_earned(child, day, earned)
+        if session_id:
+            if served:
+                self.repo.inc_session_served(session_id, served)
+            if answered:
+                self.repo.inc_session_answered(session_id)
+            if correct:
+                self.repo.inc_session_correct_earned(session_id, earned)
+            if qid is not _KEEP:
+                self.repo.set_current_qid(session_id, qid)
+        self.repo.bump_versions([child])
+
+    # session_id None = sesi stateless (cookie), cuma child_daily yang ditulis
+    def _record(self, session_id, child: str, day: str, qid=_KEEP, **deltas):
+        with self._writing():
+            if self.buffer:
+                self.buffer.add(session_id, child, day, **deltas)
+                if session_id and qid is not _KEEP:
+                    self.repo.set_current_qid(session_id, qid)
+            else:
+                self.repo.atomic(self._apply, session_id, child, day, qid=qid, **deltas)
+            self._cached(child, day, **deltas)
+
+    def inc_served(self, session_id, child: str, day: str):
+        self._record(session_id, child, day, served=1)
+
+    def inc_answered(self, session_id, child: str, day: str):
+        self._record(session_id, child, day, answered=1)
+
+    def mark_correct(self, session_id, child: str, day: str, reward: int):
+        self._record(session_id, child, day, correct=1, earned=reward)
+
+    def record_served(self, session_id, child: str, day: str, qid: str):
+        self._record(session_id, child, day, qid=qid, served=1)
+
+    def record_answer(self, session_id, child: str, day: str, correct: bool, reward: int, event=None, nonce=None) -> bool:
+        # satu jawaban = satu commit: counter sesi, child_daily dan current_qid.
+        # event: (qid, answer, latency_ms, answered_at) untuk answer_events, di luar commit ini.
+        # nonce (sesi cookie): diklaim dulu di answered_tokens; False = soal ini sudah pernah dinilai
+        if nonce is not None:
+            qid, answer, _, answered_at = event
+            if not self.repo.claim_token(nonce, child, qid, answer, correct, answered_at):
+                return False
+        self._record(session_id, child, day, qid=None, answered=1, correct=int(correct), earned=reward if correct else 0)
+        if self.events and event:
+            qid, answer, latency_ms, answered_at = event
+            self.events.append(child, day, qid, answer, correct, latency_ms, answered_at)
+        return True
+
+    def _claim_and_apply(self, items):
+        applied = []
+        for nonce, session_id, child, day, qid, answer, correct, earned, answered_at, _ in items:
+            ok = self.repo.claim_token(nonce, child, qid, answer, correct, answered_at)
+            if ok and not self.buffer:
+                self._apply(session_id, child, day, served=1, answered=1, correct=int(correct), earned=earned)
+            applied.append(ok)
+        return applied
+
+    def record_token_answers(self, session_id, session_child, answers, reward: int) -> list:
+        # answers: (nonce, child, day, qid, answer, correct, answered_at, latency_ms) berurutan; satu transaksi untuk semua.
+        # Hasil per item: False = token sudah pernah dijawab (retry / replay), counter tidak disentuh.
+        # served dihitung di sini (saat token dijawab), bukan per batch prefetch /api/questions.
+        # Counter sesi cuma ikut kalau anak di token sama dengan anak yang sedang dipilih di sesi.
+        items = [
+            (n, session_id if ch == session_child else None, ch, d, q, a, c, reward if c else 0, t, ms)
+            for n, ch, d, q, a, c, t, ms in answers
+        ]
+        with self._writing():
+            applied = self.repo.atomic(self._claim_and_apply, items)
+            for ok, (_, session_id, child, day, qid, answer, correct, earned, answered_at, latency_ms) in zip(applied, items):
+                if not ok:
+                    continue
+                if self.buffer:
+                    self.buffer.add(session_id, child, day, served=1, answered=1, correct=int(correct), earned=earned)
+                self._cached(child, day, served=1, answered=1, correct=int(correct), earned=earned)
+                if self.events:
+                    self.events.append(child, day, qid, answer, correct, latency_ms, answered_at)
+        return applied
+
+    def reset(self):
+        if self.buffer:
+            self.buffer.discard()
+        if self.events:
+            self.events.discard()
+        if self.cache:
+            self.cache.clear()
+        self._versions = {}
+        self.epoch = secrets.token_hex(4)
+        if self.bus:
+            self.bus.publish({"type": "reset"})
@@ -0,0 +1,64 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+
+class ResponseCache:
+    # LRU hasil render (body + media type) per ETag. ETag dihitung dari key yang sudah memuat
+    # versi data (StatsService.data_version), jadi entry lama tidak perlu di-invalidasi: key baru = ETag baru.
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def etag(key) -> str:
+        return '"' + hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest() + '"'
+
+    @staticmethod
+    def not_modified(request: Request, etag: str) -> bool:
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        tags = [t.strip() for t in header.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    def get(self, etag: str):
+        with self._lock:
+            hit = self._entries.get(etag)
+            if hit is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return hit
+
+    def put(self, etag: str, body: bytes, media_type: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[etag] = (body, media_type)
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def respond(self, request: Request, key, render) -> Response:
+        # render: coroutine tanpa argumen yang mengembalikan Response (dipanggil cuma saat miss)
+        etag = self.etag(key)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if self.not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        hit = self.get(etag)
+        if hit is None:
+            res = await render()
+            if res.status_code != 200:
+                return res
+            hit = (res.body, res.media_type)
+            self.put(etag, *hit)
+        body, media_type = hit
+        return Response(body, media_type=media_type, headers=headers)
@@ -1 +1,181 @@
-self.addEventListener("fetch", () => {});
\ No newline at end of file
+// App shell cache + antrian jawaban offline.
+// Jawaban yang gagal dikirim ke /api/answer disimpan di IndexedDB lalu dikirim
+// sekaligus ke /api/answers begitu koneksi kembali (idempotent per token).
+// Item cuma dibuang kalau diterima, duplicate, atau ditolak final; selain itu dicoba lagi dengan backoff.
+
+const CACHE = "kuis-shell-v1";
+const SHELL = ["/home", "/quiz", "/stats", "/manifest.json", "/static/icon-512.png"];
+const DB_NAME = "kuis-offline";
+const STORE = "answers";
+const BATCH = 200;
+const RETRY_BASE_MS = 30 * 1000;
+const RETRY_MAX_MS = 60 * 60 * 1000;
+
+self.addEventListener("install", (event) => {
+    event.waitUntil(
+        caches.open(CACHE)
+            .then((cache) => Promise.all(SHELL.map((url) => cache.add(url).catch(() => null))))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener("activate", (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then((keys) => Promise.all(keys.filter((k) => k !== CACHE).map((k) => caches.delete(k))))
+            .then(() => self.clients.claim())
+            .then(() => flushAnswers())
+    );
+});
+
+self.addEventListener("sync", (event) => {
+    if (event.tag === "answers") event.waitUntil(flushAnswers());
+});
+
+self.addEventListener("message", (event) => {
+    if (event.data && event.data.type === "flush") event.waitUntil(flushAnswers());
+});
+
+self.addEventListener("fetch", (event) => {
+    const req = event.request;
+    const url = new URL(req.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (req.method === "POST" && url.pathname === "/api/answer") {
+        event.respondWith(answerOrQueue(req));
+        return;
+    }
+    if (req.method !== "GET") return;
+
+    // soal selalu dari server: token baru per fetch, jangan di-cache
+    if (url.pathname === "/api/questions" || url.pathname === "/api/question") return;
+
+    if (req.mode === "navigate" || url.pathname.startsWith("/static/") || url.pathname === "/manifest.json" || url.pathname === "/api/stats") {
+        event.respondWith(networkFirst(req));
+    }
+});
+
+async function networkFirst(req) {
+    const cache = await caches.open(CACHE);
+    try {
+        const res = await fetch(req);
+        if (res.ok && !res.redirected) cache.put(req, res.clone());
+        flushAnswers();
+        return res;
+    } catch (e) {
+        const hit = await cache.match(req, {ignoreSearch: true});
+        if (hit) return hit;
+        throw e;
+    }
+}
+
+async function answerOrQueue(req) {
+    const body = await req.clone().json().catch(() => ({}));
+    try {
+        const res = await fetch(req);
+        flushAnswers();
+        return res;
+    } catch (e) {
+        if (!body.token) throw e;
+        await enqueue({token: body.token, answer: body.answer ?? "", ts: body.ts ?? Date.now(), latency_ms: body.latency_ms});
+        if (self.registration.sync) self.registration.sync.register("answers").catch(() => null);
+        return new Response(JSON.stringify({ok: true, queued: true}), {
+            headers: {"Content-Type": "application/json"},
+        });
+    }
+}
+
+function openDb() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open(DB_NAME, 1);
+        open.onupgradeneeded = () => open.result.createObjectStore(STORE, {keyPath: "id", autoIncrement: true});
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+function txDone(tx) {
+    return new Promise((resolve, reject) => {
+        tx.oncomplete = () => resolve();
+        tx.onerror = () => reject(tx.error);
+        tx.onabort = () => reject(tx.error);
+    });
+}
+
+async function enqueue(item) {
+    const db = await openDb();
+    const tx = db.transaction(STORE, "readwrite");
+    tx.objectStore(STORE).add(item);
+    await txDone(tx);
+}
+
+async function pending(limit) {
+    // item yang sedang backoff (retryAt di masa depan) dilewati
+    const db = await openDb();
+    const tx = db.transaction(STORE, "readonly");
+    const req = tx.objectStore(STORE).getAll();
+    await txDone(tx);
+    const now = Date.now();
+    return req.result.filter((it) => !it.retryAt || it.retryAt <= now).slice(0, limit);
+}
+
+async function remove(ids) {
+    const db = await openDb();
+    const tx = db.transaction(STORE, "readwrite");
+    const store = tx.objectStore(STORE);
+    ids.forEach((id) => store.delete(id));
+    await txDone(tx);
+}
+
+async function backoff(items) {
+    const db = await openDb();
+    const tx = db.transaction(STORE, "readwrite");
+    const store = tx.objectStore(STORE);
+    const now = Date.now();
+    items.forEach((it) => {
+        it.attempts = (it.attempts || 0) + 1;
+        it.retryAt = now + Math.min(RETRY_BASE_MS * 2 ** (it.attempts - 1), RETRY_MAX_MS);
+        store.put(it);
+    });
+    await txDone(tx);
+}
+
+let flushing = null;
+
+function flushAnswers() {
+    // satu flush berjalan pada satu waktu; urutan jawaban dipertahankan lewat key autoIncrement
+    if (!flushing) flushing = doFlush().finally(() => { flushing = null; });
+    return flushing;
+}
+
+async function doFlush() {
+    for (;;) {
+        const items = await pending(BATCH);
+        if (!items.length) return;
+
+        let res;
+        try {
+            res = await fetch("/api/answers", {
+                method: "POST",
+                headers: {"Content-Type": "application/json"},
+                body: JSON.stringify({answers: items.map(({token, answer, ts, latency_ms}) => ({token, answer, ts, latency_ms}))}),
+            });
+        } catch (e) {
+            return; // masih offline, coba lagi nanti
+        }
+        const data = res.ok ? await res.json().catch(() => null) : null;
+        if (!data || !Array.isArray(data.results)) {
+            // error server / respons aneh: simpan semua, coba lagi nanti
+            await backoff(items);
+            return;
+        }
+        const done = [], retry = [];
+        items.forEach((it, i) => {
+            const r = data.results[i];
+            if (r && (r.ok || r.final)) done.push(it.id);
+            else retry.push(it);
+        });
+        await remove(done);
+        if (retry.length) await backoff(retry);
+    }
+}